@@ -0,0 +1,269 @@
+"""Benchmarks of qzemoji. Results are printed (or saved) as JSON, so that releases can be compared.
+
+.. code-block:: shell
+
+    python bench/run.py -o bench.json
+    python bench/run.py --rows 10000 100000 1000000 --only update sha256 export
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess as sp
+import sys
+import tempfile
+import time
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiohttp import web
+
+from qzemoji.base import AsyncEngineFactory
+from qzemoji.finddb import FindDB
+from qzemoji.orm import EmojiTable
+
+ROOT = Path(__file__).parent.parent
+BUILD = ROOT / "script/build.py"
+SOURCE = ROOT / "data/emoji.yml"
+
+BENCHES: Dict[str, Callable[..., Awaitable[Dict[str, Any]]]] = {}
+
+
+def bench(func):
+    BENCHES[func.__name__] = func
+    return func
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Summarize samples (in seconds) into microseconds."""
+    samples = sorted(samples)
+    return dict(
+        n=len(samples),
+        mean_us=statistics.fmean(samples) * 1e6,
+        p50_us=samples[len(samples) // 2] * 1e6,
+        p99_us=samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+        min_us=samples[0] * 1e6,
+    )
+
+
+async def atime(func: Callable[[], Awaitable[Any]], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def build_db(out: Path) -> Path:
+    sp.run([sys.executable, BUILD, SOURCE, "-o", out], check=True, capture_output=True)
+    return out
+
+
+async def synthetic(n: int, seed: int = 0) -> Dict[int, str]:
+    rnd = random.Random(seed)
+    return {100 + i: f"emoji{rnd.randrange(1 << 30)}" for i in range(n)}
+
+
+@bench
+async def import_init(tmp: Path, repeat: int, **_):
+    db = build_db(tmp / "init.db")
+    code = (
+        "import time; t = time.perf_counter(); import qzemoji as qe; t1 = time.perf_counter(); "
+        "import asyncio; from pathlib import Path; "
+        "asyncio.run(qe.init(path=Path({!r}), offline=True)); "
+        "print(t1 - t, time.perf_counter() - t1)"
+    ).format(str(db))
+    imports, inits = [], []
+    for _ in range(repeat):
+        r = sp.run([sys.executable, "-c", code], check=True, capture_output=True, cwd=tmp)
+        t_import, t_init = map(float, r.stdout.split())
+        imports.append(t_import)
+        inits.append(t_init)
+    return {"import": summarize(imports), "init": summarize(inits)}
+
+
+@bench
+async def query(tmp: Path, repeat: int, **_):
+    db = build_db(tmp / "query.db")
+    r: Dict[str, Any] = {}
+    async with AsyncEngineFactory.sqlite3(db) as engine:
+        await EmojiTable(engine).set(101, "MyEmoji")
+        for cached in (False, True):
+            kw = {} if cached else dict(cache_size=0, miss_ttl=0)
+            tbl = EmojiTable(engine, **kw)
+            label = "cached" if cached else "uncached"
+            for case, eid in (("my_emoji", 101), ("emoji", 400343), ("miss", 1)):
+                r[f"{label}_{case}"] = summarize(await atime(lambda: tbl.query(eid), repeat))
+    return r
+
+
+@bench
+async def concurrent(tmp: Path, repeat: int, concurrency: int = 100, **_):
+    db = build_db(tmp / "concurrent.db")
+    async with AsyncEngineFactory.sqlite3(db) as engine:
+        tbl = EmojiTable(engine, cache_size=0, miss_ttl=0)
+        eids = list(range(100, 100 + concurrency))
+
+        async def burst():
+            await asyncio.gather(*(tbl.query(i) for i in eids))
+
+        samples = await atime(burst, max(1, repeat // 10))
+        many = await atime(lambda: tbl.query_many(eids), max(1, repeat // 10))
+    return dict(
+        gather=summarize(samples),
+        gather_qps=concurrency / statistics.fmean(samples),
+        query_many=summarize(many),
+        query_many_qps=concurrency / statistics.fmean(many),
+    )
+
+
+@bench
+async def update(tmp: Path, rows: List[int], **_):
+    r = {}
+    for n in rows:
+        items = await synthetic(n)
+        changed = dict(items)
+        for k in random.Random(1).sample(list(items), max(1, n // 100)):
+            changed[k] += "!"
+        async with AsyncEngineFactory.sqlite3(None) as src, AsyncEngineFactory.sqlite3(
+            tmp / f"update{n}.db"
+        ) as dst:
+            src_tbl, dst_tbl = EmojiTable(src), EmojiTable(dst)
+            await src_tbl.create()
+            await src_tbl.update_items(items, diff=False)
+
+            t = time.perf_counter()
+            await dst_tbl.update(src)
+            full = time.perf_counter() - t
+
+            await src_tbl.update_items(changed)
+            t = time.perf_counter()
+            await dst_tbl.update(src)
+            diff = time.perf_counter() - t
+        r[str(n)] = dict(full_s=full, diff_1pct_s=diff)
+    return r
+
+
+@bench
+async def sha256(tmp: Path, rows: List[int], **_):
+    r = {}
+    for n in rows:
+        async with AsyncEngineFactory.sqlite3(tmp / f"sha{n}.db") as engine:
+            tbl = EmojiTable(engine)
+            await tbl.create()
+            await tbl.update_items(await synthetic(n), diff=False)
+            t = time.perf_counter()
+            await tbl.sha256(verify=True)
+            verify = time.perf_counter() - t
+            stored = summarize(await atime(tbl.sha256, 20))
+        r[str(n)] = dict(verify_s=verify, stored=stored)
+    return r
+
+
+@bench
+async def export(tmp: Path, rows: List[int], **_):
+    r = {}
+    for n in rows:
+        async with AsyncEngineFactory.sqlite3(tmp / f"export{n}.db") as engine:
+            tbl = EmojiTable(engine)
+            await tbl.create()
+            await tbl.update_items(await synthetic(n), diff=False)
+            t = time.perf_counter()
+            await tbl.export(tmp / f"export{n}.yml")
+            r[str(n)] = dict(yaml_s=time.perf_counter() - t)
+    return r
+
+
+@bench
+async def build(tmp: Path, repeat: int, **_):
+    samples = []
+    for _ in range(max(1, repeat // 20)):
+        t = time.perf_counter()
+        build_db(tmp / "build.db")
+        samples.append(time.perf_counter() - t)
+    return dict(end_to_end=summarize(samples))
+
+
+@bench
+async def download(tmp: Path, repeat: int, **_):
+    db = build_db(tmp / "release.db")
+    async with AsyncEngineFactory.sqlite3(db) as engine:
+        sha = await EmojiTable(engine).sha256()
+
+    async def index(request: web.Request):
+        href = f"{request.url.origin()}/emoji.db#sha256={sha}"
+        return web.Response(text=f'<a href="{href}">emoji.db</a>')
+
+    app = web.Application()
+    app.router.add_get("/index.html", index)
+    app.router.add_get("/emoji.db", lambda _: web.FileResponse(db))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+
+    saved = {k: getattr(FindDB, k) for k in ("index_url", "predefined", "my_db", "validators")}
+    FindDB.index_url = f"http://127.0.0.1:{runner.addresses[0][1]}/index.html"
+    FindDB.predefined = tmp / "dl/emoji.db"
+    FindDB.my_db = tmp / "dl/myemoji.db"
+    FindDB.validators = tmp / "dl/emoji.http.json"
+    try:
+
+        async def full():
+            FindDB.predefined.unlink(missing_ok=True)
+            assert await FindDB.download()
+
+        samples = await atime(full, max(1, repeat // 20))
+        FindDB.predefined.rename(FindDB.my_db)
+        uptodate = await atime(FindDB.download, max(1, repeat // 20))
+    finally:
+        for k, v in saved.items():
+            setattr(FindDB, k, v)
+        await runner.cleanup()
+
+    return dict(
+        full=summarize(samples),
+        bytes=db.stat().st_size,
+        uptodate=summarize(uptodate),
+    )
+
+
+async def main(only: List[str], **kwds) -> Dict[str, Any]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in only:
+            print(f"running {name}...", file=sys.stderr)
+            results[name] = await BENCHES[name](Path(tmp), **kwds)
+    return dict(
+        meta=dict(
+            qzemoji=version("qzemoji"),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            time=time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            params=kwds,
+        ),
+        results=results,
+    )
+
+
+if __name__ == "__main__":
+    psr = argparse.ArgumentParser()
+    psr.add_argument("-o", "--out", type=Path, help="save results to this json file")
+    psr.add_argument("--only", nargs="+", choices=list(BENCHES), default=list(BENCHES))
+    psr.add_argument("--repeat", type=int, default=200, help="samples of each latency benchmark")
+    psr.add_argument(
+        "--rows", type=int, nargs="+", default=[10000, 100000], help="sizes of synthetic tables"
+    )
+    arg = psr.parse_args()
+
+    r = asyncio.run(main(arg.only, repeat=arg.repeat, rows=arg.rows))
+    s = json.dumps(r, indent=2)
+    if arg.out:
+        arg.out.write_text(s)
+    else:
+        print(s)
@@ -1,47 +1,108 @@
 import argparse
 import asyncio
+import csv
+import json
 import logging
 from os import environ as env
 from pathlib import Path
 from sys import stderr
+from typing import Awaitable, Callable, Dict, Tuple
 
 import yaml
 
 from qzemoji.base import AsyncEngineFactory
-from qzemoji.orm import EmojiOrm, EmojiTable
+from qzemoji.delta import Delta
+from qzemoji.orm import EmojiTable
+from qzemoji.snapshot import write_snapshot
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 DB_PATH = Path("data/emoji.db")
 DEBUG = bool(env.get("RUNNER_DEBUG"))
 
+log = logging.getLogger(__name__)
+
 
-def prepare(source: Path, out: Path):
+def prepare(source: Path, out: Path, suffix: str = ".db"):
     if not source.exists():
         raise FileNotFoundError(source)
 
-    out = out.with_name(f"{out.stem}.db")
+    out = out.with_name(f"{out.stem}{suffix}")
     out.parent.mkdir(parents=True, exist_ok=True)
     out.unlink(missing_ok=True)
     return out
 
 
-async def dump_items(source: Path, out: Path):
-    with open(source, encoding="utf8") as f:
-        d = yaml.safe_load(f)
-        assert isinstance(d, dict)
+def load_items(source: Path) -> Dict[int, str]:
+    """Load items from a yaml, jsonl or csv file, as written by :meth:`EmojiTable.export`."""
+    with open(source, encoding="utf8", newline="") as f:
+        if source.suffix == ".jsonl":
+            d = {}
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    d[int(row["eid"])] = row["text"]
+        elif source.suffix == ".csv":
+            d = {int(row["eid"]): row["text"] for row in csv.DictReader(f)}
+        else:
+            d = yaml.load(f, Loader=SafeLoader)
+            assert isinstance(d, dict)
+
+    items = {}
+    for eid, text in d.items():
+        if not text:
+            log.warning(f"{eid} null value. Skipped.")
+            continue
+        items[eid] = text
+    return items
+
 
-    async with AsyncEngineFactory.sqlite3(out) as engine:
+async def dump_db(items: Dict[int, str], out: Path) -> str:
+    # the released file should not be in WAL mode, readers may open it from read-only media
+    async with AsyncEngineFactory.sqlite3(out, wal=False) as engine:
         tbl = EmojiTable(engine)
         await tbl.create()
-        async with tbl.sess() as sess, sess.begin():
-            for eid, text in d.items():
-                if not text:
-                    log.warning(f"{eid} null value. Skipped.")
-                    continue
-                sess.add(EmojiOrm(eid=eid, text=text))
+        # bulk insert and store the digest in one transaction
+        await tbl.update_items(items, diff=False)
+
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("ANALYZE")
+            await conn.exec_driver_sql("VACUUM")
 
         return await tbl.sha256()
 
 
+async def dump_snapshot(items: Dict[int, str], out: Path) -> str:
+    return write_snapshot(out, items)
+
+
+def dump_delta(old: Dict[int, str], items: Dict[int, str], out: Path) -> Path:
+    """Write the delta from `old` to `items` beside `out`. The file is named by both digests,
+    so deltas from several old versions can be published together.
+
+    :return: path of the delta.
+    """
+    delta = Delta.compare(old, items)
+    path = out.with_name(f"{out.stem}-{delta.from_sha256[:12]}-{delta.to_sha256[:12]}.delta.json")
+    path.write_text(delta.dumps(), encoding="utf8")
+    return path
+
+
+async def dump_items(source: Path, out: Path):
+    return await dump_db(load_items(source), out)
+
+
+FORMATS: Dict[str, Tuple[str, Callable[[Dict[int, str], Path], Awaitable[str]]]] = {
+    "db": (".db", dump_db),
+    "snapshot": (".snap", dump_snapshot),
+}
+"""Artifact suffixes and writers indexed by format name. Each writer returns the sha256 of the items."""
+
+
 if __name__ == "__main__":
     psr = argparse.ArgumentParser()
     psr.add_argument("file", nargs="?", default="data/emoji.yml", type=Path)
@@ -49,12 +110,30 @@ if __name__ == "__main__":
         "-D", "--debug", help="asyncio debug mode", action="store_true", default=DEBUG
     )
     psr.add_argument("-o", "--out", type=Path, default=DB_PATH, help="output db path")
+    psr.add_argument(
+        "-f",
+        "--format",
+        choices=list(FORMATS),
+        default="db",
+        help="output artifact format. The suffix of `--out` is replaced accordingly.",
+    )
+    psr.add_argument(
+        "-d",
+        "--delta-from",
+        type=Path,
+        action="append",
+        default=[],
+        help="also write a delta from this old version of the source file. Can be repeated.",
+    )
     arg = psr.parse_args()
 
     logging.basicConfig(level="DEBUG" if arg.debug else "INFO", stream=stderr)
-    log = logging.getLogger(__name__)
 
-    arg.out = prepare(arg.file, arg.out)
-    sha256 = asyncio.run(dump_items(arg.file, arg.out), debug=arg.debug)
+    suffix, writer = FORMATS[arg.format]
+    arg.out = prepare(arg.file, arg.out, suffix)
+    items = load_items(arg.file)
+    sha256 = asyncio.run(writer(items, arg.out), debug=arg.debug)
+    for old in arg.delta_from:
+        log.info(f"delta written to {dump_delta(load_items(old), items, arg.out)}")
 
     print(sha256)
@@ -8,48 +8,151 @@
 """
 
 import asyncio
+from contextlib import nullcontext
 from functools import wraps
-from typing import Any, Awaitable, Callable, Coroutine, TypeVar
+from importlib import import_module
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Coroutine, Optional, TypeVar
 
 from typing_extensions import ParamSpec
 
-from .base import AsyncEngineFactory
-from .finddb import FindDB
-from .orm import EmojiTable
-
-__all__ = ["auto_update", "query", "set", "export"]
+if TYPE_CHECKING:
+    from .base import AsyncEngineFactory
+    from .finddb import FindDB
+    from .orm import EmojiTable
+    from .refresh import Refresher
+
+_LAZY = {
+    "AsyncEngineFactory": ".base",
+    "FindDB": ".finddb",
+    "EmojiTable": ".orm",
+    "Refresher": ".refresh",
+}
+"""Attributes imported on first access. sqlalchemy, aiohttp and yaml are not imported with the
+package, so that e.g. :mod:`qzemoji.snapshot` readers start fast and small."""
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        value = getattr(import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "init",
+    "auto_update",
+    "start_refresh",
+    "query",
+    "query_many",
+    "set",
+    "set_many",
+    "export",
+    "search",
+]
 
 
 enable_auto_update = True
-__singleton__: EmojiTable = None  # type: ignore
+__singleton__: Optional["EmojiTable"] = None
+_init_lock: Optional[asyncio.Lock] = None
+_refresher: Optional["Refresher"] = None
+_updating: Optional["asyncio.Future[None]"] = None
 
 P = ParamSpec("P")
 T = TypeVar("T")
 
 
-async def __single__():
-    """Init a singleton: a :class:`EmojiTable` instance."""
-    global __singleton__
-    if __singleton__ is None:
-        __singleton__ = EmojiTable(AsyncEngineFactory.sqlite3(await FindDB.find()).engine)
-        await __singleton__.create()
-        assert not await __singleton__.is_corrupt()
+async def init(path: Optional[Path] = None, *, offline: bool = False) -> "EmojiTable":
+    """Init the package-level singleton: a :class:`EmojiTable` instance.
+    It is called on the first query implicitly, so importing this package does no I/O.
+    Calling it after the singleton is created has no effect.
+
+    :param path: use this database, otherwise the database is found (or downloaded) by :meth:`FindDB.find`.
+    :param offline: never access the network. This disables :func:`auto_update` and uses
+        :obj:`FindDB.my_db` if `path` is not given.
+    :return: the singleton.
+
+    .. versionadded:: 6.1.0
+    """
+    global __singleton__, _init_lock, enable_auto_update
+    if __singleton__ is not None:
+        return __singleton__
+
+    from .base import AsyncEngineFactory
+    from .finddb import FindDB
+    from .orm import EmojiTable
+
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
+    async with _init_lock:
+        if __singleton__ is None:
+            if offline:
+                enable_auto_update = False
+                path = path or FindDB.my_db
+            elif path is None:
+                path = await FindDB.find()
+
+            tbl = EmojiTable(AsyncEngineFactory.sqlite3(path).engine)
+            await tbl.create()
+            assert not await tbl.is_corrupt()
+            await tbl.migrate_without_rowid()
+            __singleton__ = tbl
+    return __singleton__
 
 
 async def auto_update():
-    global enable_auto_update
-    if enable_auto_update:
-        try:
-            await FindDB.download(proxy=None)  # use env proxy
-        finally:
-            enable_auto_update = False
-
-        if not FindDB.predefined.exists():
-            return
-
-        async with AsyncEngineFactory.sqlite3(FindDB.predefined) as engine:
-            await __singleton__.update(engine)
-        FindDB.predefined.unlink()
+    """Update the database once before the first query, unless :obj:`enable_auto_update` is False.
+
+    .. versionchanged:: 6.1.0
+        Concurrent calls share one run.
+    """
+    global _updating
+    tbl = await init()
+    if not enable_auto_update:
+        return
+    if _updating is None or _updating.get_loop() is not asyncio.get_running_loop():
+        _updating = asyncio.ensure_future(_auto_update(tbl))
+    # a cancelled caller must not cancel the update shared with others
+    await asyncio.shield(_updating)
+
+
+async def _auto_update(tbl: "EmojiTable"):
+    global enable_auto_update, _updating
+    from .finddb import FindDB
+
+    try:
+        with tbl.stats.timer("auto_update") if tbl.stats else nullcontext():
+            try:
+                # use env proxy. Compare with the singleton, which may not be my_db
+                await FindDB.download(proxy=None, current=await tbl.sha256())
+            finally:
+                enable_auto_update = False
+
+            await FindDB.apply(tbl)
+    finally:
+        _updating = None
+
+
+async def start_refresh(interval: float = 86400, jitter: float = 0.1) -> "Refresher":
+    """Refresh the database in the background periodically, instead of updating before the first
+    query. Queries are never blocked by refreshing. :func:`auto_update` is disabled.
+
+    :param interval: seconds between two refreshes.
+    :param jitter: the interval is scaled randomly by ``1 ± jitter``.
+    :return: the refresher. Call :meth:`Refresher.stop` to stop it.
+
+    .. versionadded:: 6.1.0
+    """
+    global enable_auto_update, _refresher
+    from .refresh import Refresher
+
+    enable_auto_update = False
+    tbl = await init()
+    if _refresher is None:
+        _refresher = Refresher(tbl, interval=interval, jitter=jitter)
+    _refresher.start()
+    return _refresher
 
 
 def auto_update_decorator(func: Callable[P, Awaitable[T]]) -> Callable[P, Coroutine[Any, Any, T]]:
@@ -61,7 +164,22 @@ def auto_update_decorator(func: Callable[P, Awaitable[T]]) -> Callable[P, Corout
     return auto_update_wrapper
 
 
-asyncio.run(__single__())
-query = auto_update_decorator(__singleton__.query)
-set = auto_update_decorator(__singleton__.set)
-export = auto_update_decorator(__singleton__.export)
+def _singleton_method(name: str) -> Callable[..., Coroutine[Any, Any, Any]]:
+    """Bind method `name` of the singleton lazily, since the singleton does not exist before :func:`init`."""
+
+    @auto_update_decorator
+    async def method(*args, **kwds):
+        assert __singleton__
+        return await getattr(__singleton__, name)(*args, **kwds)
+
+    method.__name__ = method.__qualname__ = name
+    method.__doc__ = f"Call :meth:`EmojiTable.{name}` of the singleton, see :func:`init`."
+    return method
+
+
+query = _singleton_method("query")
+query_many = _singleton_method("query_many")
+set = _singleton_method("set")
+set_many = _singleton_method("set_many")
+export = _singleton_method("export")
+search = _singleton_method("search")
@@ -1,12 +1,30 @@
 from os import PathLike
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 
-__all__ = ["auto_update", "query", "set", "export"]
+from .orm import EmojiTable
+from .refresh import Refresher
+
+__all__ = [
+    "init",
+    "auto_update",
+    "start_refresh",
+    "query",
+    "query_many",
+    "set",
+    "set_many",
+    "export",
+    "search",
+]
 
 enable_auto_update: bool
 
+async def init(path: Optional[Path] = None, *, offline: bool = False) -> EmojiTable: ...
 async def auto_update(): ...
+async def start_refresh(interval: float = 86400, jitter: float = 0.1) -> Refresher: ...
 async def query(eid: int) -> Optional[str]: ...
+async def query_many(eids: Iterable[int]) -> Dict[int, Optional[str]]: ...
 async def set(eid: int, text: str) -> None: ...
-async def export(path: PathLike, full: bool = True) -> Path: ...
+async def set_many(mapping: Mapping[int, str]) -> None: ...
+async def export(path: PathLike, full: bool = True, format: Optional[str] = None) -> Path: ...
+async def search(text: str, limit: int = 10) -> List[Tuple[int, str]]: ...
@@ -4,6 +4,7 @@
 from pathlib import Path
 from typing import Optional, Type
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker as sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine
@@ -12,15 +13,59 @@ from sqlalchemy.orm import DeclarativeBase
 
 class AsyncEngineFactory:
     @classmethod
-    def sqlite3(cls, path: Optional[Path], **kwds):
+    def sqlite3(
+        cls,
+        path: Optional[Path],
+        *,
+        read_only: bool = False,
+        wal: bool = True,
+        mmap_size: int = 64 << 20,
+        cache_size: int = -8192,
+        pool_size: int = 8,
+        **kwds,
+    ):
+        """Create an engine on a sqlite3 database with a profile suited to many concurrent readers.
+
+        :param path: database path, `None` means an in-memory database.
+        :param read_only: open the database with a ``mode=ro`` URI. Reader processes should
+            set this so that they never take a write lock.
+        :param wal: switch the database to WAL journal mode with ``synchronous=NORMAL``, so that
+            readers are not blocked by writers. The journal mode is persistent in the file.
+        :param mmap_size: ``PRAGMA mmap_size`` in bytes, 0 disables memory-mapped I/O.
+        :param cache_size: ``PRAGMA cache_size``, negative means KiB, positive means pages.
+        :param pool_size: connections kept in the pool of a file database.
+        :param kwds: passed to :func:`create_async_engine` and override the profile.
+
+        .. versionchanged:: 6.1.0
+            Added the read-heavy profile.
+        """
         if path is None:
             url = "sqlite+aiosqlite://"
+        elif read_only:
+            url = "sqlite+aiosqlite:///file:" + path.as_posix() + "?mode=ro&uri=true"
         else:
             url = "sqlite+aiosqlite:///" + path.as_posix()
         # make dir if parent not exist
-        if path:
+        if path and not read_only:
             path.parent.mkdir(parents=True, exist_ok=True)
+
+        pragmas = [f"PRAGMA mmap_size={int(mmap_size)}", f"PRAGMA cache_size={int(cache_size)}"]
+        if path and wal and not read_only:
+            pragmas[:0] = ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"]
+        if path:
+            # an in-memory database uses a StaticPool which has no size
+            kwds.setdefault("pool_size", pool_size)
+            kwds.setdefault("max_overflow", pool_size)
+
         engine = create_async_engine(url, **kwds)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_pragmas(dbapi_conn, _):
+            cursor = dbapi_conn.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
         return cls(engine)
 
     def __init__(self, engine: AsyncEngine) -> None:
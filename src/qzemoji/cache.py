@@ -0,0 +1,111 @@
+"""In-process caches used by :class:`~qzemoji.orm.EmojiTable`."""
+
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, NamedTuple, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+MISSING = object()
+"""Returned by :meth:`LRUCache.get` if the key is not cached. ``None`` is a valid cached value."""
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: Optional[int]
+    currsize: int
+
+
+class LRUCache(Generic[K, V]):
+    """A mapping with least-recently-used eviction and hit/miss statistics.
+
+    :param maxsize: max number of entries. `None` means unbounded, 0 means caching nothing.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[K, V]" = OrderedDict()
+
+    def get(self, key: K, default=MISSING):
+        """Get the cached value and mark it as recently used. Hits and misses are counted.
+
+        :return: the cached value, or `default` if not cached.
+        """
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key: K, value: V):
+        if self.maxsize == 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def pop(self, key: K, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        """Drop all entries. Statistics are kept."""
+        self._data.clear()
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+
+class TTLSet(Generic[K]):
+    """A set whose members expire `ttl` seconds after being added. It is used to remember
+    misses (negative caching).
+
+    :param ttl: seconds before a member expires. 0 means remembering nothing.
+    :param maxsize: max number of members, the oldest is dropped first. `None` means unbounded.
+    """
+
+    def __init__(self, ttl: float = 60, maxsize: Optional[int] = 1024) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self._expire: "OrderedDict[K, float]" = OrderedDict()
+
+    def add(self, key: K):
+        if self.ttl <= 0 or self.maxsize == 0:
+            return
+        self._expire[key] = time.monotonic() + self.ttl
+        self._expire.move_to_end(key)
+        if self.maxsize is not None and len(self._expire) > self.maxsize:
+            self._expire.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        expire = self._expire.get(key)
+        if expire is None:
+            return False
+        if expire < time.monotonic():
+            del self._expire[key]
+            return False
+        self.hits += 1
+        return True
+
+    def __len__(self) -> int:
+        return len(self._expire)
+
+    def discard(self, key: K):
+        self._expire.pop(key, None)
+
+    def clear(self):
+        self._expire.clear()
@@ -0,0 +1,87 @@
+"""Differences between two versions of the `Emoji` table, keyed by their digests.
+
+A delta is published along with the full database, so that a client holding the ``from``
+version only downloads the rows that changed.
+
+.. versionadded:: 6.1.0
+"""
+
+import json
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .orm import digest
+
+
+class Delta(NamedTuple):
+    """Rows to add, change and remove to turn the table of digest `from_sha256` into the table
+    of digest `to_sha256`."""
+
+    from_sha256: str
+    to_sha256: str
+    add: Dict[int, str]
+    change: Dict[int, str]
+    remove: Tuple[int, ...]
+
+    @classmethod
+    def compare(cls, old: Dict[int, str], new: Dict[int, str]) -> "Delta":
+        return cls(
+            from_sha256=digest(sorted(old.items())),
+            to_sha256=digest(sorted(new.items())),
+            add={k: v for k, v in new.items() if k not in old},
+            change={k: v for k, v in new.items() if k in old and old[k] != v},
+            remove=tuple(sorted(k for k in old if k not in new)),
+        )
+
+    def apply(self, old: Dict[int, str]) -> Dict[int, str]:
+        """Apply the delta to `old`, which should be the table of digest `from_sha256`.
+
+        :return: the new table. `old` is not modified.
+        :raises ValueError: if the result does not match `to_sha256`.
+        """
+        new = dict(old)
+        for eid in self.remove:
+            new.pop(eid, None)
+        new.update(self.change)
+        new.update(self.add)
+        got = digest(sorted(new.items()))
+        if got != self.to_sha256:
+            raise ValueError(f"sha256 mismatch: expect {self.to_sha256}, got {got}")
+        return new
+
+    def patch(self) -> List[Tuple[int, Optional[str]]]:
+        """The delta as ``(eid, text)`` pairs sorted by eid, where removed ids have no text."""
+        rows: Dict[int, Optional[str]] = dict.fromkeys(self.remove)
+        rows.update(self.change)
+        rows.update(self.add)
+        return sorted(rows.items())
+
+    def dumps(self) -> str:
+        return json.dumps(
+            {
+                "from": self.from_sha256,
+                "to": self.to_sha256,
+                "add": self.add,
+                "change": self.change,
+                "remove": self.remove,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+
+    @classmethod
+    def loads(cls, s: str) -> "Delta":
+        """Parse a delta written by :meth:`.dumps`.
+
+        :raises ValueError: if `s` is not a valid delta.
+        """
+        try:
+            d = json.loads(s)
+            return cls(
+                from_sha256=d["from"].lower(),
+                to_sha256=d["to"].lower(),
+                add={int(k): v for k, v in d["add"].items()},
+                change={int(k): v for k, v in d["change"].items()},
+                remove=tuple(int(i) for i in d["remove"]),
+            )
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError("invalid delta") from e
@@ -1,14 +1,25 @@
+import asyncio
+import json
+import logging
+import os
 import re
 import shutil
 from pathlib import Path
-from typing import Optional, Union
+from typing import Awaitable, Callable, Dict, Mapping, Optional, TypeVar, Union
 
 from aiofiles import open as aopen
+from aiohttp import ClientError
 from aiohttp import ClientSession as AsyncClient
 from yarl import URL
 
 from qzemoji.base import AsyncEngineFactory
-from qzemoji.orm import EmojiTable
+from qzemoji.delta import Delta
+from qzemoji.orm import EmojiTable, UpdateSummary
+from qzemoji.stats import Stats, timed
+
+T = TypeVar("T")
+
+log = logging.getLogger(__name__)
 
 FALLBACK_DB = "https://github.com/aioqzone/QzEmoji/releases/download/4.1.1.dev1/emoji.db"
 
@@ -16,61 +27,313 @@ FALLBACK_DB = "https://github.com/aioqzone/QzEmoji/releases/download/4.1.1.dev1/
 class FindDB:
     """This class can download database from source or find existing database on local storage."""
 
+    index_url = "https://aioqzone.github.io/aioqzone-index/simple/qzemoji/index.html"
+    """The index page which links to the latest database."""
+
     predefined = Path("data/emoji.db")
     """Download to this path. After download, the file will be moved to :obj:`.my_db`."""
 
     my_db = Path("data/myemoji.db")
 
+    delta = Path("data/emoji.delta.json")
+    """Download a delta from the current :obj:`.my_db` to this path, if the index offers one.
+    :meth:`.apply` applies it instead of :obj:`.predefined`."""
+
+    validators = Path("data/emoji.http.json")
+    """HTTP validators (``ETag``, ``Last-Modified``) of the index page and the database,
+    used for conditional requests and resuming."""
+
+    stats: Optional[Stats] = None
+    """Collect download counters and latencies into this object, if not None."""
+
+    _inflight: Dict[str, asyncio.Task] = {}
+    """Running :meth:`.download` and :meth:`.find`, shared by concurrent callers."""
+
+    @classmethod
+    async def _single_flight(cls, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Run ``factory()`` unless a call with the same `key` is in flight, in which case
+        wait for that one instead."""
+        task = cls._inflight.get(key)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = cls._inflight[key] = asyncio.ensure_future(factory())
+        else:
+            cls._count(key + ".coalesced")
+        # a cancelled caller must not cancel the run shared with others
+        return await asyncio.shield(task)
+
+    @classmethod
+    def _count(cls, name: str, n: int = 1):
+        if cls.stats is not None and n:
+            cls.stats.incr(name, n)
+
+    @classmethod
+    def _load_validators(cls) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(cls.validators, encoding="utf8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def _save_validators(cls, url: str, headers: Mapping[str, str]):
+        d = cls._load_validators()
+        d[url] = {k: headers[k] for k in ("ETag", "Last-Modified") if k in headers}
+        cls.validators.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cls.validators.with_name(cls.validators.name + ".tmp")
+        with open(tmp, "w", encoding="utf8") as f:
+            json.dump(d, f)
+        os.replace(tmp, cls.validators)
+
+    @classmethod
+    def _conditional_headers(cls, url: str) -> Dict[str, str]:
+        v = cls._load_validators().get(url, {})
+        headers = {}
+        if "ETag" in v:
+            headers["If-None-Match"] = v["ETag"]
+        if "Last-Modified" in v:
+            headers["If-Modified-Since"] = v["Last-Modified"]
+        return headers
+
     @classmethod
     async def download(
         cls,
         *,
         client: Optional[AsyncClient] = None,
         proxy: Union[str, URL, None] = None,
-        buffer_size=4096,
+        buffer_size=65536,
+        full: bool = False,
+        current: Optional[str] = None,
     ) -> bool:
         """
         The download function downloads the latest version of the emoji database from GitHub.
         If there is no newer version, it does nothing.
 
+        The index page is requested conditionally (``If-None-Match``/``If-Modified-Since``) if
+        :obj:`.my_db` exists. The database is written to a ``.part`` file, which is resumed if the
+        last download was interrupted, verified against the advertised sha256 and then atomically
+        renamed to :obj:`.predefined`. So no one will read a half-written database.
+
         :param client: use this client, otherwise we will create one and close it on return.
         :param proxy: Used to pass a proxy to the download function, defaults to None.
+        :param buffer_size: size of chunks read from the response.
+        :param full: always download the whole database, even if the index offers a delta from
+            the current database. The index page is not requested conditionally then.
+        :param current: digest of the table to be updated, see :meth:`EmojiTable.sha256`. It
+            decides whether there is a newer version and which delta to download. Default to
+            the digest of :obj:`.my_db`.
+        :raises ClientError: if there is a current database and the index page cannot be
+            fetched. :obj:`FALLBACK_DB` is only used for the first download.
+        :raises ValueError: if the downloaded database doesn't match the advertised sha256.
         :return: if downloaded.
+
+        .. versionchanged:: 6.1.0
+
+            conditional requests, verification, atomic write and resuming. Concurrent calls
+            share one download. Download a delta if the index offers one.
         """
+        return await cls._single_flight(
+            "download",
+            lambda: cls._download_with(
+                client, proxy=proxy, buffer_size=buffer_size, full=full, current=current
+            ),
+        )
+
+    @classmethod
+    async def _download_with(
+        cls,
+        client: Optional[AsyncClient],
+        *,
+        proxy: Union[str, URL, None],
+        buffer_size: int,
+        full: bool,
+        current: Optional[str],
+    ) -> bool:
+        kw = dict(proxy=proxy, buffer_size=buffer_size, full=full, current=current)
         if client is None:
             async with AsyncClient(trust_env=proxy is None) as client:
-                return await cls.download(client=client, proxy=proxy, buffer_size=buffer_size)
+                return await cls._download(client, **kw)
+        return await cls._download(client, **kw)
 
-        async def get_online_url() -> Optional[str]:
-            r = await client.get(
-                "https://aioqzone.github.io/aioqzone-index/simple/qzemoji/index.html", proxy=proxy
+    @classmethod
+    @timed("download")
+    async def _download(
+        cls,
+        client: AsyncClient,
+        *,
+        proxy: Union[str, URL, None],
+        buffer_size: int,
+        full: bool,
+        current: Optional[str],
+    ) -> bool:
+        url = expected = None
+        index_headers: Mapping[str, str] = {}
+        deltas: Dict[str, str] = {}
+        mine = None
+        if cls.my_db.exists():
+            async with AsyncEngineFactory.sqlite3(cls.my_db) as engine:
+                mine = await EmojiTable(engine).sha256()
+        if current is None:
+            current = mine
+        has_db = current is not None
+        try:
+            # the validators are saved for my_db, they say nothing about another table
+            conditional = has_db and not full and current == mine
+            headers = cls._conditional_headers(cls.index_url) if conditional else {}
+            async with client.get(cls.index_url, proxy=proxy, headers=headers) as r:
+                if r.status == 304:
+                    cls._count("download.not_modified")
+                    return False
+                r.raise_for_status()
+                index_headers = r.headers
+                index = await r.text()
+                m = re.search(r'<a\s+href="(http.*)">\s*emoji.db\s*</a>', index)
+                url = m and m.group(1)
+                deltas = cls._parse_deltas(index)
+        except ClientError:
+            if has_db:
+                # keep the current database rather than falling back to an unverified one
+                raise
+            log.warning(
+                "Failed to fetch the index, download the fallback database.", exc_info=True
             )
-            m = re.search(r'<a\s+href="(http.*)">\s*emoji.db\s*</a>', await r.text())
-            return m and m.group(1)
 
-        url = None
-        if cls.my_db.exists():
-            url = await get_online_url()
-            if url:
-                m = re.search(r"#sha256=(\w+)", url)
-                if m:
-                    async with AsyncEngineFactory.sqlite3(cls.my_db) as engine:
-                        if m.group(1).lower() == await EmojiTable(engine).sha256():
-                            return False
+        if has_db and not (url and "#sha256=" in url):
+            # the fallback and unverified databases are never applied over an existing table
+            log.warning(f"No verifiable database found in {cls.index_url}, skip updating.")
+            return False
+
+        if url:
+            m = re.search(r"#sha256=(\w+)", url)
+            if m:
+                expected = m.group(1).lower()
+                url = url[: url.find("#")]
+                if has_db:
+                    if expected == current:
+                        if current == mine:
+                            cls._save_validators(cls.index_url, index_headers)
+                        cls._count("download.uptodate")
+                        return False
+                    delta_url = deltas.get(f"{current}..{expected}")
+                    if delta_url and not full:
+                        try:
+                            await cls._fetch_delta(client, delta_url, proxy=proxy)
+                        except (ClientError, ValueError):
+                            log.warning("Failed to download the delta.", exc_info=True)
+                            cls._count("download.delta_fallback")
                         else:
-                            url = url[: url.find("#")]
-        if url is None:
+                            cls._save_validators(cls.index_url, index_headers)
+                            return True
+        else:
             url = FALLBACK_DB
 
-        cls.predefined.parent.mkdir(exist_ok=True)
-        async with client.get(url, proxy=proxy, allow_redirects=True) as r, aopen(
-            cls.predefined, "wb"
-        ) as f:
-            async for b in r.content.iter_chunked(buffer_size):
-                await f.write(b)
+        part = cls.predefined.with_name(cls.predefined.name + ".part")
+        part.parent.mkdir(parents=True, exist_ok=True)
+        await cls._fetch(client, url, part, proxy=proxy, buffer_size=buffer_size)
 
+        if expected:
+            async with AsyncEngineFactory.sqlite3(part) as engine:
+                got = await EmojiTable(engine).sha256(verify=True)
+            if got != expected:
+                part.unlink()
+                raise ValueError(f"sha256 mismatch: expect {expected}, got {got}")
+
+        os.replace(part, cls.predefined)
+        cls._save_validators(cls.index_url, index_headers)
         return True
 
+    @staticmethod
+    def _parse_deltas(index: str) -> Dict[str, str]:
+        """Find delta links like ``<a href="...#from=<sha256>&to=<sha256>">emoji.delta</a>``.
+
+        :return: urls of the deltas, keyed by ``<from>..<to>``.
+        """
+        deltas = {}
+        for href in re.findall(r'<a\s+href="(http[^"]*)">\s*emoji.delta\s*</a>', index):
+            url = URL(href)
+            frag = dict(p.split("=", 1) for p in url.fragment.split("&") if "=" in p)
+            if "from" in frag and "to" in frag:
+                key = f"{frag['from'].lower()}..{frag['to'].lower()}"
+                deltas[key] = str(url.with_fragment(None))
+        return deltas
+
+    @classmethod
+    async def _fetch_delta(cls, client: AsyncClient, url: str, *, proxy: Union[str, URL, None]):
+        """Download a delta to :obj:`.delta`. It is small so it is not resumed."""
+        async with client.get(url, proxy=proxy) as r:
+            r.raise_for_status()
+            content = await r.read()
+        cls._count("download.delta")
+        cls._count("download.bytes", len(content))
+        Delta.loads(content.decode("utf8"))  # raise early if corrupted
+        cls.delta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cls.delta.with_name(cls.delta.name + ".part")
+        tmp.write_bytes(content)
+        os.replace(tmp, cls.delta)
+
+    @classmethod
+    async def _fetch(
+        cls,
+        client: AsyncClient,
+        url: str,
+        part: Path,
+        *,
+        proxy: Union[str, URL, None] = None,
+        buffer_size=65536,
+    ):
+        """Download `url` into `part`. Resume from the end of `part` if it exists and the
+        resource is not changed since the last download."""
+        headers = {}
+        validator = cls._load_validators().get(url, {})
+        if part.exists() and validator:
+            headers["Range"] = f"bytes={part.stat().st_size}-"
+            headers["If-Range"] = validator.get("ETag") or validator["Last-Modified"]
+
+        async with client.get(url, proxy=proxy, headers=headers, allow_redirects=True) as r:
+            if r.status == 416:
+                # the part file is not a prefix of the resource. Restart.
+                part.unlink()
+                return await cls._fetch(client, url, part, proxy=proxy, buffer_size=buffer_size)
+            r.raise_for_status()
+            cls._save_validators(url, r.headers)
+
+            async with aopen(part, "ab" if r.status == 206 else "wb") as f:
+                async for b in r.content.iter_chunked(buffer_size):
+                    await f.write(b)
+                    cls._count("download.bytes", len(b))
+
+    @classmethod
+    async def apply(
+        cls, table: EmojiTable, proxy: Union[URL, str, None] = None
+    ) -> Optional[UpdateSummary]:
+        """Apply the downloaded delta or :obj:`.predefined` database to `table` and remove it.
+        If the delta does not apply to `table`, the whole database is downloaded instead.
+
+        :param proxy: used if the whole database has to be downloaded.
+        :return: what has changed, or None if nothing is downloaded.
+
+        .. versionadded:: 6.1.0
+        """
+        if cls.delta.exists():
+            try:
+                return await table.apply_delta(Delta.loads(cls.delta.read_text(encoding="utf8")))
+            except ValueError:
+                log.warning(
+                    "Failed to apply the delta, download the whole database.", exc_info=True
+                )
+                cls._count("download.delta_fallback")
+            finally:
+                cls.delta.unlink(missing_ok=True)
+            await cls.download(proxy=proxy, full=True, current=await table.sha256())
+
+        if not cls.predefined.exists():
+            return
+
+        # read-only, so that a file removed meanwhile by another process is not created empty
+        async with AsyncEngineFactory.sqlite3(cls.predefined, read_only=True) as engine:
+            summary = await table.update(engine)
+        cls.predefined.unlink(missing_ok=True)
+        return summary
+
     @classmethod
     async def find(cls, proxy: Union[URL, str, None] = None) -> Optional[Path]:
         """
@@ -78,8 +341,17 @@ class FindDB:
 
         :param proxy: Used to pass a proxy to the download function, defaults to None.
         :return: the path to the database, or None if download error.
+
+        .. versionchanged:: 6.1.0
+
+            Concurrent calls share one run.
         """
+        if cls.my_db.exists():
+            return cls.my_db
+        return await cls._single_flight("find", lambda: cls._find(proxy))
 
+    @classmethod
+    async def _find(cls, proxy: Union[URL, str, None]) -> Optional[Path]:
         if cls.my_db.exists():
             return cls.my_db
 
@@ -0,0 +1,138 @@
+"""Approximate frequencies of unknown emoji ids in fixed memory.
+
+.. versionadded:: 6.1.0
+"""
+
+import heapq
+import time
+from array import array
+from os import PathLike
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_PRIME = (1 << 61) - 1
+_SEEDS = (
+    (0x9E3779B97F4A7C15, 0x632BE59BD9B4E019),
+    (0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9),
+    (0x85EBCA77C2B2AE63, 0x27D4EB2F165667C5),
+    (0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53),
+    (0xD6E8FEB86659FD93, 0x94D049BB133111EB),
+    (0xBF58476D1CE4E5B9, 0x2545F4914F6CDD1D),
+)
+
+
+class MissCollector:
+    """Count unknown emoji ids with a count-min sketch and keep the `top_k` most frequent ones.
+    Memory usage is fixed whatever ids are seen.
+
+    Counts are over-estimated by at most ``2 * total / width`` with probability
+    ``1 - 2 ** -depth``.
+
+    :param width: counters per row of the sketch.
+    :param depth: rows of the sketch, each with its own hash.
+    :param top_k: max number of ids remembered.
+    :param interval: seconds between two flushes, see :meth:`.due`. `None` means never due.
+    """
+
+    def __init__(
+        self,
+        width: int = 2048,
+        depth: int = 4,
+        top_k: int = 100,
+        interval: Optional[float] = 600,
+    ) -> None:
+        assert 0 < depth <= len(_SEEDS), f"depth should be in [1, {len(_SEEDS)}]"
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.interval = interval
+        self.total = 0
+        self._rows: List["array[int]"] = []
+        self._top: Dict[int, int] = {}
+        # (count, eid) of `_top`, entries whose count is outdated are skipped lazily
+        self._heap: List[Tuple[int, int]] = []
+        self.clear()
+
+    def _slots(self, eid: int):
+        for (a, b), row in zip(_SEEDS, self._rows):
+            yield row, (a * eid + b) % _PRIME % self.width
+
+    def add(self, eid: int, n: int = 1) -> int:
+        """Count `n` misses of `eid`.
+
+        :return: the estimated count of `eid`.
+        """
+        self.total += n
+        est = None
+        for row, i in self._slots(eid):
+            row[i] += n
+            est = row[i] if est is None else min(est, row[i])
+        assert est is not None
+
+        if eid in self._top or len(self._top) < self.top_k:
+            self._top[eid] = est
+            heapq.heappush(self._heap, (est, eid))
+        elif self.top_k > 0 and est > self._min_top():
+            _, evict = heapq.heappop(self._heap)
+            del self._top[evict]
+            self._top[eid] = est
+            heapq.heappush(self._heap, (est, eid))
+
+        if len(self._heap) > 4 * self.top_k:
+            self._heap = [(c, i) for i, c in self._top.items()]
+            heapq.heapify(self._heap)
+        return est
+
+    def _min_top(self) -> int:
+        # drop outdated entries so that the heap top is the least frequent id in `_top`
+        while self._heap:
+            count, eid = self._heap[0]
+            if self._top.get(eid) == count:
+                return count
+            heapq.heappop(self._heap)
+        return 0
+
+    def estimate(self, eid: int) -> int:
+        """The estimated miss count of `eid`. It is never less than the real count."""
+        return min(row[i] for row, i in self._slots(eid))
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[int, int]]:
+        """The most frequent ids with their estimated counts, most frequent first.
+
+        :param n: return at most this many ids, default to all remembered ids.
+        """
+        return heapq.nlargest(n or len(self._top), self._top.items(), key=lambda t: t[1])
+
+    def due(self) -> bool:
+        """Whether `interval` seconds have passed since the last :meth:`.clear`."""
+        if self.interval is None or not self._top:
+            return False
+        return time.monotonic() - self._last_flush >= self.interval
+
+    def clear(self):
+        """Reset all counts, e.g. after they are flushed."""
+        self._rows = [array("Q", bytes(8 * self.width)) for _ in range(self.depth)]
+        self.total = 0
+        self._top.clear()
+        self._heap.clear()
+        self._last_flush = time.monotonic()
+
+    def export(self, path: PathLike, n: Optional[int] = None) -> Path:
+        """Export the most frequent ids in the layout of :meth:`EmojiTable.export`, with null
+        texts to be filled in. The estimated counts are written as comments. ``script/build.py``
+        skips null values, so the file can be merged into ``data/emoji.yml`` as it is.
+
+        :param path: where to export.
+        :param n: export at most this many ids.
+        :return: export path
+        """
+        if not isinstance(path, Path):
+            path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf8") as f:
+            top = sorted(self.top(n))
+            if not top:
+                f.write("{}\n")
+            for eid, count in top:
+                f.write(f"{eid}: null  # missed {count} times\n")
+        return path
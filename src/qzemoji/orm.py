@@ -1,18 +1,56 @@
 import asyncio
+import csv
+import json
+import logging
+import time
+from contextlib import nullcontext, suppress
 from hashlib import sha256
 from os import PathLike
 from pathlib import Path
-from typing import Optional, cast
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    cast,
+)
 
 import sqlalchemy as sa
 import yaml
 from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine import Inspector
-from sqlalchemy.ext.asyncio import AsyncEngine
-from sqlalchemy.ext.asyncio import async_sessionmaker as sessionmaker
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 from sqlalchemy.orm import DeclarativeBase, Mapped, MappedAsDataclass, mapped_column
 
 from .base import AsyncSessionProvider
+from .cache import MISSING, CacheInfo, LRUCache, TTLSet
+from .misses import MissCollector
+from .search import ReverseIndex
+from .stats import Stats, observe, timed
+
+if TYPE_CHECKING:
+    from .delta import Delta
+
+log = logging.getLogger(__name__)
+
+EXPORT_SUFFIX = {".yml": "yaml", ".yaml": "yaml", ".jsonl": "jsonl", ".csv": "csv"}
+"""Export formats guessed from file suffix."""
+
+IN_CHUNK = 900
+"""Max number of ids in one ``IN (...)`` clause. Old SQLite limits a statement to 999 variables."""
+
+
+def _chunks(seq: List[int], size: int = IN_CHUNK):
+    for i in range(0, len(seq), size):
+        yield seq[i : i + size]
 
 
 class Base(MappedAsDataclass, DeclarativeBase):
@@ -21,6 +59,7 @@ class Base(MappedAsDataclass, DeclarativeBase):
 
 class EmojiOrm(Base):
     __tablename__ = "Emoji"
+    __table_args__ = {"sqlite_with_rowid": False}
 
     eid: Mapped[int] = mapped_column(sa.Integer, primary_key=True)
     text: Mapped[str] = mapped_column(sa.VARCHAR)
@@ -28,12 +67,332 @@ class EmojiOrm(Base):
 
 class MyEmoji(Base):
     __tablename__ = "MyEmoji"
+    __table_args__ = {"sqlite_with_rowid": False}
 
     eid: Mapped[int] = mapped_column(sa.Integer, primary_key=True)
     text: Mapped[str] = mapped_column(sa.VARCHAR)
 
 
+class Meta(Base):
+    """Key-value metadata of the database, e.g. the digest of ``Emoji`` table."""
+
+    __tablename__ = "Meta"
+
+    key: Mapped[str] = mapped_column(sa.VARCHAR, primary_key=True)
+    value: Mapped[str] = mapped_column(sa.VARCHAR)
+
+
+class MissedEmoji(Base):
+    """Unknown emoji ids seen in queries, flushed by :meth:`EmojiTable.flush_misses`."""
+
+    __tablename__ = "MissedEmoji"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    eid: Mapped[int] = mapped_column(sa.Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(sa.Integer)
+
+
+_emoji = cast(sa.Table, EmojiOrm.__table__)
+_my = cast(sa.Table, MyEmoji.__table__)
+_missed = cast(sa.Table, MissedEmoji.__table__)
+
+QUERY_STMT = select(
+    select(_my.c.text).where(_my.c.eid == sa.bindparam("eid")).scalar_subquery().label("my"),
+    select(_emoji.c.text)
+    .where(_emoji.c.eid == sa.bindparam("eid"))
+    .scalar_subquery()
+    .label("emoji"),
+)
+"""Look up `MyEmoji` and `Emoji` in one statement. Built once, so the compiled SQL is cached
+by the engine."""
+
+
+class Digest:
+    """Incremental :func:`digest`, fed with rows in batches.
+
+    .. versionadded:: 6.1.0
+    """
+
+    def __init__(self) -> None:
+        self._h = sha256()
+        self._sep = b""
+
+    def update(self, rows: Iterable[Tuple[int, str]]):
+        """:param rows: ``(eid, text)`` pairs sorted by eid, following the rows fed before."""
+        h = self._h
+        for eid, text in rows:
+            h.update(self._sep + f"{eid}={text}".encode("utf8"))
+            self._sep = b";"
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest().lower()
+
+
+def digest(rows: Iterable[Tuple[int, str]]) -> str:
+    """Calculate sha256 of emoji rows. This is the digest of ``Emoji`` table.
+
+    :param rows: ``(eid, text)`` pairs sorted by eid.
+    :return: sha256 in lower case.
+    """
+    d = Digest()
+    d.update(rows)
+    return d.hexdigest()
+
+
+ROW_SOURCES = ("Emoji", "MyEmoji", "merged")
+"""Tables accepted by :meth:`EmojiTable.iter_rows`. ``merged`` is `MyEmoji` over `Emoji`."""
+
+
+def _rows_stmt(table: str) -> sa.Select:
+    my = select(_my.c.eid, _my.c.text)
+    emoji = select(_emoji.c.eid, _emoji.c.text)
+    if table == "Emoji":
+        return emoji.order_by(_emoji.c.eid)
+    if table == "MyEmoji":
+        return my.order_by(_my.c.eid)
+    if table == "merged":
+        emoji = emoji.where(_emoji.c.eid.not_in(select(_my.c.eid)))
+        return cast(sa.Select, sa.union_all(my, emoji).order_by("eid"))
+    raise ValueError(f"unknown table: {table}, expect one of {ROW_SOURCES}")
+
+
+async def _stream_batches(
+    conn: AsyncConnection, table: str, batch: int = 1000
+) -> AsyncIterator[List[Tuple[int, str]]]:
+    r = await conn.stream(_rows_stmt(table).execution_options(yield_per=batch))
+    async for rows in r.partitions():
+        yield [(row.eid, row.text) for row in rows]
+
+
+async def _stream_rows(
+    conn: AsyncConnection, table: str, batch: int = 1000
+) -> AsyncIterator[Tuple[int, str]]:
+    async for rows in _stream_batches(conn, table, batch):
+        for row in rows:
+            yield row
+
+
+async def _aiter(
+    rows: Iterable[Tuple[int, Optional[str]]],
+) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    for row in rows:
+        yield row
+
+
+META_SHA256 = "sha256"
+META_VERSION = "version"
+"""A counter bumped by every write to `Emoji` or `MyEmoji`. Processes sharing the database
+poll it to find out whether their caches are stale."""
+
+
+async def _set_meta(conn: AsyncConnection, key: str, value: str):
+    stmt = sqlite_insert(Meta).values(key=key, value=value)
+    await conn.execute(
+        stmt.on_conflict_do_update(index_elements=[Meta.key], set_=dict(value=value))
+    )
+
+
+async def _bump_version(conn: AsyncConnection) -> int:
+    """Increase :obj:`META_VERSION` in the transaction of `conn`.
+
+    :return: the new version.
+    """
+    meta = cast(sa.Table, Meta.__table__)
+    stmt = sqlite_insert(meta).values(key=META_VERSION, value="1")
+    await conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[meta.c.key],
+            set_=dict(value=sa.cast(sa.cast(meta.c.value, sa.Integer) + 1, sa.VARCHAR)),
+        )
+    )
+    return int(await conn.scalar(select(meta.c.value).where(meta.c.key == META_VERSION)))
+
+
+def _log_flush_error(task: "asyncio.Task[None]"):
+    if not task.cancelled() and task.exception():
+        log.warning("Failed to flush missed emoji ids.", exc_info=task.exception())
+
+
+class UpdateSummary(NamedTuple):
+    """Emoji ids that are added, changed or removed by :meth:`EmojiTable.update`."""
+
+    added: Tuple[int, ...] = ()
+    changed: Tuple[int, ...] = ()
+    removed: Tuple[int, ...] = ()
+
+    def eids(self) -> Iterator[int]:
+        """Iterate over all ids touched by the update."""
+        yield from self.added
+        yield from self.changed
+        yield from self.removed
+
+
 class EmojiTable(AsyncSessionProvider):
+    """Interface to `Emoji` and `MyEmoji` table.
+
+    Query results are cached in memory. The cache is written through by :meth:`.set` and
+    invalidated by :meth:`.update`, so it never returns stale results.
+    Ids that are not found are remembered for `miss_ttl` seconds, so repeated unknown ids are
+    answered in memory as well.
+
+    :param engine: the database engine.
+    :param cache_size: max number of cached query results (and of remembered misses).
+        `None` means unbounded, 0 disables the cache.
+    :param miss_ttl: seconds to remember an unknown id. 0 disables negative caching.
+    :param stats: collect counters and latencies of operations into this object. Instrumentation
+        is disabled if None.
+    :param write_behind: if not None, :meth:`.set` buffers texts and commits them in one batch
+        after this many seconds. Call :meth:`.flush` to commit at once.
+    :param check_interval: queries check :obj:`META_VERSION` at most once per this many seconds
+        and drop the caches if another process has written the database. Changes by other
+        processes are then seen within this delay. None disables the check, for a database
+        that no one else writes.
+    :param batch_window: concurrent :meth:`.query` calls that miss the cache within this many
+        seconds are answered by one SQL query, and calls for the same id share one lookup.
+        0 gathers the calls made in the same event loop iteration.
+    :param misses: count ids that are not found into this collector. The most frequent ones are
+        written to `MissedEmoji` table by :meth:`.flush_misses`, which is scheduled once the
+        collector is :meth:`~MissCollector.due`.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        *,
+        cache_size: Optional[int] = 1024,
+        miss_ttl: float = 60,
+        stats: Optional[Stats] = None,
+        write_behind: Optional[float] = None,
+        check_interval: Optional[float] = 1,
+        batch_window: float = 0,
+        misses: Optional[MissCollector] = None,
+    ) -> None:
+        super().__init__(engine)
+        self.cache: LRUCache[int, str] = LRUCache(cache_size)
+        self.negative: TTLSet[int] = TTLSet(miss_ttl, cache_size)
+        self.stats = stats
+        self.write_behind = write_behind
+        self._pending: Dict[int, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._preloaded = False
+        self.check_interval = check_interval
+        self._version: Optional[int] = None
+        self._next_check = 0.0
+        self.batch_window = batch_window
+        self._inflight: Dict[int, "asyncio.Future[Optional[str]]"] = {}
+        self._batch: List[int] = []
+        self._batch_task: Optional[asyncio.Task] = None
+        self.misses = misses
+        self._misses_task: Optional[asyncio.Task] = None
+        self._index: Optional[ReverseIndex] = None
+        self._index_task: Optional[asyncio.Task] = None
+        self._writes = 0
+        """incremented on every write, so that a reverse index built meanwhile is discarded"""
+
+    def _count(self, name: str, n: int = 1):
+        if self.stats is not None and n:
+            self.stats.incr(name, n)
+
+    def _record_miss(self, eid: int):
+        if self.misses is None:
+            return
+        self.misses.add(eid)
+        if self.misses.due() and (self._misses_task is None or self._misses_task.done()):
+            self._misses_task = asyncio.create_task(self.flush_misses())
+            self._misses_task.add_done_callback(_log_flush_error)
+
+    async def flush_misses(self):
+        """Add the counts of the most frequent missed ids to `MissedEmoji` table in one
+        transaction. The collector is reset before the write, so that misses during the write
+        are counted afresh. If the write fails, the flushed counts are added back for the next
+        flush.
+
+        .. versionadded:: 6.1.0
+        """
+        misses = self.misses
+        if misses is None:
+            return
+        top = misses.top()
+        if not top:
+            return
+        misses.clear()
+        stmt = sqlite_insert(_missed)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[_missed.c.eid], set_=dict(count=_missed.c.count + stmt.excluded.count)
+        )
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(_missed.create, checkfirst=True)
+                await conn.execute(stmt, [dict(eid=eid, count=count) for eid, count in top])
+        except BaseException:
+            for eid, count in top:
+                misses.add(eid, count)
+            raise
+
+    def cache_info(self) -> CacheInfo:
+        """Statistics of the query cache.
+
+        .. versionadded:: 6.1.0
+        """
+        return self.cache.info()
+
+    def _seen_version(self, version: int):
+        """Record the version written by ourselves. If it is not the successor of the known
+        version, someone else has written in between, so it is left to :meth:`.check_version`.
+        Before the first check, the caches only hold our own writes, so it is recorded as is."""
+        if self._version is None or self._version + 1 == version:
+            self._version = version
+
+    async def check_version(self) -> bool:
+        """Compare :obj:`META_VERSION` in the database with the one seen last time. If it has
+        changed, i.e. another process has written the database, the caches are dropped (or the
+        table is preloaded again).
+
+        :return: whether the caches are dropped.
+
+        .. versionadded:: 6.1.0
+        """
+        if self.check_interval is not None:
+            self._next_check = time.monotonic() + self.check_interval
+        try:
+            async with self.engine.connect() as conn:
+                stored = await conn.scalar(select(Meta.value).where(Meta.key == META_VERSION))
+        except sa.exc.OperationalError:
+            stored = None
+        version = int(stored or 0)
+        if self._version is None:
+            # the first check. Queries check before reading, so the caches are not stale.
+            self._version = version
+            return False
+        if version == self._version:
+            return False
+
+        self._version = version
+        self._count("cache.invalidate")
+        self.cache.clear()
+        self.negative.clear()
+        self._index = None
+        self._writes += 1
+        if self._preloaded:
+            await self.preload()
+        return True
+
+    @timed("preload")
+    async def preload(self):
+        """Load the whole (merged) table into memory. After that the cache is unbounded
+        and every :meth:`.query` is answered without touching the database.
+
+        .. versionadded:: 6.1.0
+        """
+        if self._version is None and self.check_interval is not None:
+            await self.check_version()  # record the version before reading
+        self.cache.maxsize = None
+        self.cache.clear()
+        async for rows in self._iter_batches("merged"):
+            for eid, text in rows:
+                self.cache[eid] = text
+        self._preloaded = True
+
     async def create(self, conn=None):
         """
         The create function creates `Emoji` and `MyEmoji` table in the database.
@@ -43,6 +402,58 @@ class EmojiTable(AsyncSessionProvider):
         """
         return await self._create(Base, conn=conn)
 
+    async def migrate_without_rowid(self) -> bool:
+        """Rebuild `Emoji` and `MyEmoji` as ``WITHOUT ROWID`` tables, if they were created by an
+        older version. The rows are then stored in the primary key b-tree, which saves a lookup
+        per query. The migration is a no-op once done.
+
+        pysqlite commits DDL on its own, so the migration runs under an explicit
+        ``BEGIN IMMEDIATE``: processes migrating the same file together take turns, and a failed
+        migration leaves nothing behind.
+
+        :return: whether any table is rebuilt.
+
+        .. versionadded:: 6.1.0
+        """
+
+        async def legacy(conn: AsyncConnection) -> List[sa.Table]:
+            tables = []
+            for table in (_emoji, _my):
+                sql = await conn.scalar(
+                    sa.text("SELECT sql FROM sqlite_master WHERE type='table' AND name=:name"),
+                    dict(name=table.name),
+                )
+                if sql is not None and "WITHOUT ROWID" not in sql.upper():
+                    tables.append(table)
+            return tables
+
+        async with self.engine.connect() as conn:
+            if not await legacy(conn):
+                return False
+            await conn.rollback()
+
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                # others may have migrated while we were waiting for the lock
+                tables = await legacy(conn)
+                for table in tables:
+                    new = table.to_metadata(sa.MetaData(), name=table.name + "_new")
+                    await conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{new.name}"')
+                    await conn.run_sync(new.create)
+                    await conn.execute(new.insert().from_select(["eid", "text"], select(table)))
+                    await conn.run_sync(table.drop)
+                    await conn.exec_driver_sql(
+                        f'ALTER TABLE "{new.name}" RENAME TO "{table.name}"'
+                    )
+            except BaseException:
+                with suppress(sa.exc.OperationalError):
+                    # sqlite may have rolled back already
+                    await conn.exec_driver_sql("ROLLBACK")
+                raise
+            await conn.exec_driver_sql("COMMIT")
+        return bool(tables)
+
     async def is_corrupt(self) -> bool:
         def test2(conn):
             insp = sa.inspect(conn)
@@ -51,7 +462,7 @@ class EmojiTable(AsyncSessionProvider):
         async with self.engine.begin() as conn:
             return not await conn.run_sync(test2)
 
-    async def query(self, eid: int) -> Optional[str]:
+    def query(self, eid: int) -> Awaitable[Optional[str]]:
         """
         The query function takes an emoji ID and returns the corresponding string.
         If no emoji is found, it will return string identified by `default`.
@@ -60,17 +471,148 @@ class EmojiTable(AsyncSessionProvider):
         :param default: Used to specify a default value, defaults to return str(eid).
         :return: a string representation of the emoji, or None if not found.
         """
+        # the hottest path: timed inline with a fixed signature instead of by :func:`timed`
+        stats = self.stats
+        if stats is None:
+            return self._query(eid)
+        return observe(stats, "query", self._query(eid))
+
+    async def _query(self, eid: int) -> Optional[str]:
+        if self.check_interval is not None and time.monotonic() >= self._next_check:
+            await self.check_version()
+        if self._pending and eid in self._pending:
+            return self._pending[eid]
+        cached = self.cache.get(eid)
+        if cached is not MISSING:
+            self._count("query.cache")
+            return cached
+        if self._preloaded or eid in self.negative:
+            # a known miss, or the whole table is in memory so a cache miss is a table miss
+            self._count("query.miss")
+            self._record_miss(eid)
+            return
+
+        text = await self._query_db(eid)
+        if text is None:
+            self._record_miss(eid)
+        return text
+
+    async def _query_db(self, eid: int) -> Optional[str]:
+        """Look up `eid` in the next batch. Concurrent lookups of the same id share one future."""
+        fut = self._inflight.get(eid)
+        if fut is None:
+            fut = self._inflight[eid] = asyncio.get_running_loop().create_future()
+            self._batch.append(eid)
+            if self._batch_task is None:
+                self._batch_task = asyncio.create_task(self._run_batch())
+        else:
+            self._count("query.coalesced")
+        # a cancelled caller must not cancel the lookup shared with others
+        return await asyncio.shield(fut)
+
+    async def _run_batch(self):
+        await asyncio.sleep(self.batch_window)
+        batch, self._batch, self._batch_task = self._batch, [], None
+        found: Dict[int, str] = {}
+        error: Optional[Exception] = None
+        try:
+            with self.stats.timer("query.db") if self.stats else nullcontext():
+                found = await self._fetch(batch)
+        except Exception as e:
+            # passed to the callers instead of being raised from this task
+            error = e
+        except BaseException:
+            for eid in batch:
+                self._inflight.pop(eid).cancel()
+            raise
+
+        for eid in batch:
+            fut = self._inflight.pop(eid)
+            if fut.done():
+                continue
+            if error is None:
+                fut.set_result(found.get(eid))
+            else:
+                fut.set_exception(error)
+
+    async def _fetch(self, todo: List[int]) -> Dict[int, str]:
+        """Query uncached ids from the database and fill the caches. `MyEmoji` takes priority
+        over `Emoji`.
+
+        :return: texts of the ids that are found.
+        """
+        found: Dict[int, str] = {}
+        async with self.engine.connect() as conn:
+            if len(todo) == 1:
+                my, emoji = (await conn.execute(QUERY_STMT, dict(eid=todo[0]))).one()
+                n_my = int(my is not None)
+                text = emoji if my is None else my
+                if text is not None:
+                    found[todo[0]] = text
+            else:
+                for chunk in _chunks(todo):
+                    r = await conn.execute(
+                        select(_my.c.eid, _my.c.text).where(_my.c.eid.in_(chunk))
+                    )
+                    found.update((row.eid, row.text) for row in r)
+                n_my = len(found)
+                rest = [i for i in todo if i not in found]
+                for chunk in _chunks(rest):
+                    r = await conn.execute(
+                        select(_emoji.c.eid, _emoji.c.text).where(_emoji.c.eid.in_(chunk))
+                    )
+                    found.update((row.eid, row.text) for row in r)
+
+        self._count("query.my_emoji", n_my)
+        self._count("query.emoji", len(found) - n_my)
+        self._count("query.miss", len(todo) - len(found))
+        for eid in todo:
+            text = found.get(eid)
+            if text is None:
+                self.negative.add(eid)
+            else:
+                self.cache[eid] = text
+        return found
+
+    @timed("query_many")
+    async def query_many(self, eids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """Query a batch of emoji IDs at once. Duplicated ids are queried only once.
+        Uncached ids are answered with one ``IN (...)`` query per table in one connection,
+        and `MyEmoji` takes priority over `Emoji` as in :meth:`.query`.
+
+        :param eids: emoji IDs to query.
+        :return: a dict from each given id to its text, or None if not found. Keys keep the input order.
+
+        .. versionadded:: 6.1.0
+        """
+        if self.check_interval is not None and time.monotonic() >= self._next_check:
+            await self.check_version()
+        result: Dict[int, Optional[str]] = dict.fromkeys(eids)
+        todo: List[int] = []
+        n_miss = 0
+        for eid in result:
+            if self._pending and eid in self._pending:
+                result[eid] = self._pending[eid]
+                continue
+            cached = self.cache.get(eid)
+            if cached is not MISSING:
+                result[eid] = cached
+            elif self._preloaded or eid in self.negative:
+                n_miss += 1
+            else:
+                todo.append(eid)
 
-        stmt = select(MyEmoji).where(MyEmoji.eid == eid)
-        async with self.sess() as sess:
-            r1 = await sess.scalar(stmt)
-            if r1:
-                return r1.text
-            stmt = select(EmojiOrm).where(EmojiOrm.eid == eid)
-            r2 = await sess.scalar(stmt)
-        if r2:
-            return r2.text
+        self._count("query.cache", len(result) - len(todo) - n_miss)
+        self._count("query.miss", n_miss)
+        if todo:
+            result.update(await self._fetch(todo))
+        if self.misses is not None:
+            for eid, text in result.items():
+                if text is None:
+                    self._record_miss(eid)
+        return result
 
+    @timed("set")
     async def set(self, eid: int, text: str):
         """
         The set function is used to set the text of an emoji.
@@ -78,105 +620,405 @@ class EmojiTable(AsyncSessionProvider):
         eid is the id of the emoji you want to change.
         text is what you want to set it's current text into.
 
+        If `write_behind` is set, the text is buffered and committed later with other sets.
+        It is visible to :meth:`.query` at once.
+
         :param eid: Used to identify the emoji.
         :param text: Used to set the text of an emoji.
         :return: None.
+
+        .. versionchanged:: 6.1.0
+
+            upsert in one statement, support write-behind.
         """
+        if self.write_behind is None:
+            await self._upsert({eid: text})
+            return
 
-        async with self.sess() as sess:
-            async with sess.begin():
-                prev = await sess.scalar(select(MyEmoji).where(MyEmoji.eid == eid))
-                if prev:
-                    # if exist: update
-                    prev.text = text
-                else:
-                    # not exist: add
-                    sess.add(MyEmoji(eid=eid, text=text))
-            await sess.commit()
+        self._pending[eid] = text
+        self.cache[eid] = text
+        self._writes += 1
+        if self._index is not None:
+            self._index.update_my([(eid, text)])
+        self.negative.discard(eid)
+        self._schedule_flush()
+
+    @timed("set_many")
+    async def set_many(self, mapping: Mapping[int, str]):
+        """Set texts of many emojis with one ``INSERT ... ON CONFLICT DO UPDATE`` executemany in
+        one transaction. Write-behind is bypassed.
+
+        :param mapping: emoji ids to their texts.
 
-    async def update(self, engine: AsyncEngine):
+        .. versionadded:: 6.1.0
+        """
+        # buffered texts of these ids are older. Replace them so that a flush, even one in
+        # flight, cannot bring them back.
+        for eid, text in mapping.items():
+            if eid in self._pending:
+                self._pending[eid] = text
+        await self._upsert(mapping)
+
+    async def _upsert(self, mapping: Mapping[int, str]):
+        if not mapping:
+            return
+        stmt = sqlite_insert(_my)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[_my.c.eid], set_=dict(text=stmt.excluded.text)
+        )
+        async with self.engine.begin() as conn:
+            await conn.execute(stmt, [dict(eid=k, text=v) for k, v in mapping.items()])
+            version = await _bump_version(conn)
+        self._seen_version(version)
+        self._writes += 1
+
+        for eid, text in mapping.items():
+            if self._pending.get(eid, text) != text:
+                # a newer text is pending
+                continue
+            self.cache[eid] = text
+            self.negative.discard(eid)
+            if self._index is not None:
+                self._index.update_my([(eid, text)])
+
+    def _schedule_flush(self):
+        if self.write_behind is None:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(self.write_behind))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self):
+        """Commit texts buffered by write-behind :meth:`.set` in one batch.
+
+        .. versionadded:: 6.1.0
+        """
+        task, self._flush_task = self._flush_task, None
+        if task and task is not asyncio.current_task():
+            task.cancel()
+        if not self._pending:
+            return
+        batch = dict(self._pending)
+        await self._upsert(batch)
+        for eid, text in batch.items():
+            # sets during the commit are kept
+            if self._pending.get(eid) is text:
+                del self._pending[eid]
+        if self._pending:
+            self._schedule_flush()
+
+    @timed("update")
+    async def update(self, engine: AsyncEngine, *, diff: bool = True) -> "UpdateSummary":
         """
         The update function is used to update the database with new data.
-        It drops `Emoji` table in current database, and import all data from the given engine.
+        It compares `Emoji` table in current database with the one in the given engine,
+        and applies the difference in one transaction. Readers never see an empty table.
 
         :param engine: Engine to a new database to get data from.
-        :return: None.
+        :param diff: apply only inserts, updates and deletes. If False, all rows in current
+            `Emoji` table are deleted and the incoming rows are inserted, still in one transaction.
+        :return: what has changed.
 
         .. versionchanged:: 4.1.0.dev3
 
             update `Version` table as well
-        """
 
-        sess = sessionmaker(engine)
-        stmt = select(EmojiOrm)
+        .. versionchanged:: 6.1.0
 
-        def clear_o_table(c: sa.Connection):
-            isp: Optional[Inspector] = sa.inspect(c)
-            assert isp is not None
-            if isp.has_table(EmojiOrm.__tablename__):
-                cast(sa.Table, EmojiOrm.__table__).drop(c)
-            EmojiOrm.metadata.create_all(c)
+            apply the difference instead of dropping the table, and return a summary.
+        """
 
         def check_n_table(c: sa.Connection):
             isp: Optional[Inspector] = sa.inspect(c)
             assert isp.has_table(EmojiOrm.__tablename__), "Incoming database has no `Emoji` table."
 
-        async with self.engine.begin() as oc, engine.begin() as nc:
-            # drop if exists, and create again
-            await asyncio.gather(oc.run_sync(clear_o_table), nc.run_sync(check_n_table))
+        async with engine.connect() as nc:
+            await nc.run_sync(check_n_table)
+            return await self._update_rows(_stream_rows(nc, "Emoji"), diff=diff)
+
+    async def update_items(self, new: Dict[int, str], *, diff: bool = True) -> "UpdateSummary":
+        """Replace `Emoji` table with `new` in one transaction. The digest of `new` is
+        calculated in the same pass and stored. This is the bulk write path under :meth:`.update`.
+
+        :param new: the new content of `Emoji` table.
+        :param diff: apply only inserts, updates and deletes.
+        :return: what has changed.
+
+        .. versionadded:: 6.1.0
+        """
+        return await self._update_rows(_aiter(sorted(new.items())), diff=diff)
+
+    async def _update_rows(
+        self,
+        new: AsyncIterator[Tuple[int, Optional[str]]],
+        *,
+        diff: bool = True,
+        patch: bool = False,
+        expect: Optional[str] = None,
+    ) -> "UpdateSummary":
+        """Merge-join `new` rows (sorted by eid) with the current `Emoji` table, so that neither
+        side is loaded into memory. Only the difference is kept, and written after the join in
+        the same transaction. If `diff` is False, the incoming rows are kept to be inserted.
+
+        If `patch` is True, `new` only holds the rows to change: current rows not in `new` are
+        kept, and rows with a None text are removed. If the digest of the result is not
+        `expect`, ValueError is raised before anything is written."""
+        h = Digest()
+        added: List[Tuple[int, str]] = []
+        changed: List[Tuple[int, str]] = []
+        removed: List[int] = []
+        kept: List[Tuple[int, str]] = []
+
+        async def anext_or_none(it: AsyncIterator[Tuple[int, Optional[str]]]):
+            try:
+                return await it.__anext__()
+            except StopAsyncIteration:
+                return None
 
-        async with self.sess() as os:
-            async with sess() as ns:
-                objs = (await ns.scalars(stmt)).all()
-            async with os.begin():
-                os.add_all([EmojiOrm(eid=i.eid, text=i.text) for i in objs])
-            await os.commit()
+        async with self.engine.begin() as oc:
+            await oc.run_sync(Base.metadata.create_all)
+            old = self.iter_rows("Emoji", conn=oc)
+            o, n = await anext_or_none(old), await anext_or_none(new)
+            while o is not None or n is not None:
+                if n is None or (o is not None and o[0] < n[0]):
+                    assert o is not None
+                    if not patch:
+                        removed.append(o[0])
+                    else:
+                        h.update((o,))
+                        if not diff:
+                            kept.append(o)
+                    o = await anext_or_none(old)
+                    continue
+                if n[1] is None:
+                    # removed by a patch
+                    if o is not None and o[0] == n[0]:
+                        removed.append(o[0])
+                        o = await anext_or_none(old)
+                    n = await anext_or_none(new)
+                    continue
+                h.update((n,))
+                if o is None or n[0] < o[0]:
+                    added.append(n)
+                else:
+                    if o[1] != n[1]:
+                        changed.append(n)
+                    elif not diff:
+                        kept.append(n)
+                    o = await anext_or_none(old)
+                n = await anext_or_none(new)
+
+            if expect is not None and h.hexdigest() != expect:
+                raise ValueError(f"sha256 mismatch: expect {expect}, got {h.hexdigest()}")
+            summary = UpdateSummary(
+                added=tuple(eid for eid, _ in added),
+                changed=tuple(eid for eid, _ in changed),
+                removed=tuple(removed),
+            )
+            if diff:
+                for chunk in _chunks(removed):
+                    await oc.execute(sa.delete(_emoji).where(_emoji.c.eid.in_(chunk)))
+                if changed:
+                    await oc.execute(
+                        sa.update(_emoji)
+                        .where(_emoji.c.eid == sa.bindparam("b_eid"))
+                        .values(text=sa.bindparam("b_text")),
+                        [dict(b_eid=eid, b_text=text) for eid, text in changed],
+                    )
+                inserts = added
+            else:
+                await oc.execute(sa.delete(_emoji))
+                inserts = sorted(added + changed + kept)
+            if inserts:
+                await oc.execute(
+                    sa.insert(_emoji), [dict(eid=eid, text=text) for eid, text in inserts]
+                )
+            await _set_meta(oc, META_SHA256, h.hexdigest())
+            version = await _bump_version(oc) if not diff or any(summary) else None
+
+        if version is not None:
+            self._seen_version(version)
+        self._writes += 1
+        if self._index is not None:
+            self._index.update_emoji(added + changed, removed)
+        self.negative.clear()
+        if self._preloaded:
+            await self.preload()
+        else:
+            for eid in summary.eids():
+                self.cache.pop(eid)
+        return summary
+
+    @timed("search")
+    async def search(self, text: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """Find emojis by text, e.g. ``微`` finds ``(100, "微笑")``. Exact matches come first,
+        then prefix matches, then fuzzy matches ranked by the characters shared with `text`.
+
+        The reverse index is built from the merged table on the first call, and then updated
+        incrementally by :meth:`.set` and :meth:`.update`.
+
+        :param text: the text, or part of it, to search.
+        :param limit: max number of results.
+        :return: ``(eid, text)`` pairs.
+
+        .. versionadded:: 6.1.0
+        """
+        if self.check_interval is not None and time.monotonic() >= self._next_check:
+            await self.check_version()
+        if self._index is None:
+            if self._index_task is None or self._index_task.done():
+                self._index_task = asyncio.ensure_future(self._build_index())
+            await asyncio.shield(self._index_task)
+        assert self._index is not None
+        return self._index.search(text, limit)
 
-    async def export(self, path: PathLike, full: bool = True) -> Path:
+    async def _build_index(self):
+        while self._index is None:
+            writes = self._writes
+            index = ReverseIndex()
+            async for rows in self._iter_batches("Emoji"):
+                index.update_emoji(rows)
+            async for rows in self._iter_batches("MyEmoji"):
+                index.update_my(rows)
+            index.update_my(self._pending.items())
+            if writes == self._writes:
+                # otherwise a write during the build may be missed, build again
+                self._index = index
+
+    @timed("apply_delta")
+    async def apply_delta(self, delta: "Delta") -> "UpdateSummary":
+        """Apply a :class:`~qzemoji.delta.Delta` to `Emoji` table. Only the rows in the delta are
+        written, in one transaction as :meth:`.update_items`. The other rows are streamed to
+        verify the digest of the result, but never loaded as a whole.
+
+        :param delta: the delta from the current version.
+        :raises ValueError: if the current table is not `delta.from_sha256`, or the result is not
+            `delta.to_sha256`. The table is not modified then.
+        :return: what has changed.
+
+        .. versionadded:: 6.1.0
+        """
+        current = await self.sha256()
+        if current != delta.from_sha256:
+            raise ValueError(f"delta is from {delta.from_sha256}, but the table is {current}")
+
+        return await self._update_rows(_aiter(delta.patch()), patch=True, expect=delta.to_sha256)
+
+    async def iter_rows(
+        self, table: str = "Emoji", *, batch: int = 1000, conn: Optional[AsyncConnection] = None
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """Stream rows as plain ``(eid, text)`` tuples in eid order. Rows are fetched `batch` at a
+        time from a server-side cursor, so memory usage stays flat however large the table is.
+
+        :param table: one of :obj:`ROW_SOURCES`. ``merged`` yields `MyEmoji` rows and the
+            `Emoji` rows not overridden, as :meth:`.query` sees them.
+        :param batch: rows fetched at a time.
+        :param conn: use this connection, otherwise we will create one and close it on return.
+        :raises ValueError: if `table` is unknown.
+
+        .. versionadded:: 6.1.0
+        """
+        async for rows in self._iter_batches(table, batch=batch, conn=conn):
+            for row in rows:
+                yield row
+
+    async def _iter_batches(
+        self, table: str, *, batch: int = 1000, conn: Optional[AsyncConnection] = None
+    ) -> AsyncIterator[List[Tuple[int, str]]]:
+        if conn is None:
+            async with self.engine.connect() as conn:
+                async for rows in _stream_batches(conn, table, batch):
+                    yield rows
+        else:
+            async for rows in _stream_batches(conn, table, batch):
+                yield rows
+
+    @timed("export")
+    async def export(
+        self, path: PathLike, full: bool = True, format: Optional[str] = None
+    ) -> Path:
         """Export emoji table to a yaml file. User may start a PR with this file.
+        Rows are streamed in eid order and written incrementally, so memory usage stays flat.
 
         :param path: Where to export
         :param full: If data in `Emoji` table should be export. Keep this value as True if you'd like to submit a PR.
+        :param format: one of ``yaml``, ``jsonl``, ``csv``. Default to guess from suffix of `path`,
+            and fallback to ``yaml``.
         :return: export path
 
         .. versionchanged:: 4.0.0
 
             path is not optional
-        """
-        stmp = select(MyEmoji)
-        stmg = select(EmojiOrm)
-        async with self.sess() as sess:
-            if full:
-                # rp, rg = await asyncio.gather(sess.scalars(stmp), sess.scalars(stmg))
-                # BUG: asyncio.gather broken
-                rp = await sess.scalars(stmp)
-                rg = await sess.scalars(stmg)
-            else:
-                rp = await sess.scalars(stmp)
-                rg = ()  # just suppress warning
 
-        d = {o.eid: o.text for o in rg}
-        d.update({o.eid: o.text for o in rp})
+        .. versionchanged:: 6.1.0
 
+            stream rows, add `format`.
+        """
         if not isinstance(path, Path):
             path = Path(path)
+        if format is None:
+            format = EXPORT_SUFFIX.get(path.suffix, "yaml")
         path.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(path, "w", encoding="utf8") as f:
-            yaml.safe_dump(d, f, sort_keys=True, allow_unicode=True)
+        with open(path, "w", encoding="utf8", newline="") as f:
+            if format == "yaml":
+                empty = True
+                async for rows in self._iter_batches("merged" if full else "MyEmoji"):
+                    yaml.dump(
+                        dict(rows), f, Dumper=yaml.SafeDumper, sort_keys=True, allow_unicode=True
+                    )
+                    empty = empty and not rows
+                if empty:
+                    yaml.dump({}, f, Dumper=yaml.SafeDumper)
+            elif format == "jsonl":
+                async for rows in self._iter_batches("merged" if full else "MyEmoji"):
+                    for eid, text in rows:
+                        f.write(json.dumps(dict(eid=eid, text=text), ensure_ascii=False) + "\n")
+            elif format == "csv":
+                w = csv.writer(f)
+                w.writerow(("eid", "text"))
+                async for rows in self._iter_batches("merged" if full else "MyEmoji"):
+                    w.writerows(rows)
+            else:
+                raise ValueError(f"unknown format: {format}")
         return path
 
-    async def sha256(self) -> str:
-        """Calculate sha256 of ``Emoji`` table.
+    @timed("sha256")
+    async def sha256(self, verify: bool = False) -> str:
+        """Get sha256 of ``Emoji`` table. The digest is stored in ``Meta`` table by :meth:`.update`
+        and ``script/build.py``, so this is O(1) in most cases. If it is not stored yet, it is
+        calculated from the whole table. Nothing is written then, so this works on a read-only
+        database as well.
 
+        :param verify: always calculate from the whole table, and fix the stored value if the
+            database is writable.
         :return: sha256 in lower case.
 
         .. versionadded:: 5.0.0
+
+        .. versionchanged:: 6.1.0
+
+            read the stored digest, add `verify`.
         """
-        statement = select(EmojiOrm)
-        async with self.sess() as sess:
-            r = await sess.scalars(statement)
+        if not verify:
+            try:
+                async with self.engine.connect() as conn:
+                    stored = await conn.scalar(select(Meta.value).where(Meta.key == META_SHA256))
+            except sa.exc.OperationalError:
+                stored = None  # no Meta table
+            if stored:
+                return stored
 
-        d = {o.eid: o.text for o in r}
-        s = ";".join(f"{k}={d[k]}" for k in sorted(d))
-        return sha256(s.encode("utf8")).hexdigest().lower()
+        d = Digest()
+        async for rows in self._iter_batches("Emoji"):
+            d.update(rows)
+        h = d.hexdigest()
+        if verify:
+            with suppress(sa.exc.OperationalError):  # read-only
+                async with self.engine.begin() as conn:
+                    await conn.run_sync(Meta.__table__.create, checkfirst=True)
+                    await _set_meta(conn, META_SHA256, h)
+        return h
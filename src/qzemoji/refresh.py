@@ -0,0 +1,93 @@
+"""Refresh an :class:`~qzemoji.orm.EmojiTable` periodically in the background."""
+
+import asyncio
+import logging
+import random
+from typing import Optional, Union
+
+from yarl import URL
+
+from .finddb import FindDB
+from .orm import EmojiTable, UpdateSummary
+
+log = logging.getLogger(__name__)
+
+
+class Refresher:
+    """A background task that downloads the latest database with :class:`FindDB` and applies it
+    to `table`. Queries are served from current data all the time, since :meth:`EmojiTable.update`
+    swaps the new data in within one transaction.
+
+    :param table: the table to refresh.
+    :param interval: seconds between two refreshes.
+    :param jitter: the interval is scaled randomly by ``1 ± jitter``, so that processes started
+        together do not refresh together.
+    :param proxy: passed to :meth:`FindDB.download`. None means using proxy from environment.
+
+    .. versionadded:: 6.1.0
+    """
+
+    def __init__(
+        self,
+        table: EmojiTable,
+        interval: float = 86400,
+        jitter: float = 0.1,
+        proxy: Union[str, URL, None] = None,
+    ) -> None:
+        assert interval > 0
+        assert 0 <= jitter < 1
+        self.table = table
+        self.interval = interval
+        self.jitter = jitter
+        self.proxy = proxy
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def refresh(self) -> Optional[UpdateSummary]:
+        """Download and apply the latest database once.
+
+        :return: what has changed, or None if there is no newer version.
+        """
+        await FindDB.download(proxy=self.proxy, current=await self.table.sha256())
+        return await FindDB.apply(self.table, proxy=self.proxy)
+
+    async def _run(self, delay: float):
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                summary = await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.warning("Failed to refresh emoji table", exc_info=True)
+            else:
+                if summary:
+                    log.info(
+                        f"Emoji table refreshed: {len(summary.added)} added, "
+                        f"{len(summary.changed)} changed, {len(summary.removed)} removed."
+                    )
+            delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self, delay: float = 0) -> asyncio.Task:
+        """Start refreshing in the background. Calling this when it is running has no effect.
+
+        :param delay: seconds before the first refresh.
+        """
+        if not self.running:
+            self._task = asyncio.create_task(self._run(delay))
+        assert self._task
+        return self._task
+
+    async def stop(self):
+        """Stop refreshing. A running refresh is cancelled."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
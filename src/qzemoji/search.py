@@ -0,0 +1,152 @@
+"""Reverse index from emoji text to emoji ids.
+
+.. versionadded:: 6.1.0
+"""
+
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def normalize(text: str) -> str:
+    """Normalize text for matching: NFKC, case folded and stripped."""
+    return unicodedata.normalize("NFKC", text).casefold().strip()
+
+
+class ReverseIndex:
+    """Map texts back to emoji ids. Texts in `MyEmoji` override those in `Emoji`, as in
+    :meth:`EmojiTable.query <qzemoji.orm.EmojiTable.query>`.
+
+    Exact matches are looked up in a dict, prefix matches by bisecting a sorted list of texts,
+    and fuzzy matches are ranked by the characters shared with the query, found through an
+    inverted index of characters. All of them are updated incrementally.
+    """
+
+    def __init__(self) -> None:
+        self._emoji: Dict[int, str] = {}
+        self._my: Dict[int, str] = {}
+        self._eids: Dict[str, List[int]] = {}
+        """normalized text -> sorted eids"""
+        self._keys: List[str] = []
+        """sorted normalized texts"""
+        self._chars: Dict[str, Set[str]] = defaultdict(set)
+        """char -> normalized texts containing it"""
+        self._nchars: Dict[str, int] = {}
+        """normalized text -> number of distinct chars"""
+
+    def __len__(self) -> int:
+        return len(self._emoji.keys() | self._my.keys())
+
+    def text(self, eid: int) -> Optional[str]:
+        """The merged text of `eid`."""
+        return self._my.get(eid, self._emoji.get(eid))
+
+    def _link(self, eid: int, text: str):
+        key = normalize(text)
+        eids = self._eids.get(key)
+        if eids is None:
+            eids = self._eids[key] = []
+            insort(self._keys, key)
+            chars = set(key)
+            self._nchars[key] = len(chars)
+            for c in chars:
+                self._chars[c].add(key)
+        insort(eids, eid)
+
+    def _unlink(self, eid: int, text: str):
+        key = normalize(text)
+        eids = self._eids[key]
+        eids.remove(eid)
+        if eids:
+            return
+        del self._eids[key]
+        del self._keys[bisect_left(self._keys, key)]
+        del self._nchars[key]
+        for c in set(key):
+            self._chars[c].discard(key)
+            if not self._chars[c]:
+                del self._chars[c]
+
+    def _put(self, layer: Dict[int, str], eid: int, text: Optional[str]):
+        old = self.text(eid)
+        if text is None:
+            layer.pop(eid, None)
+        else:
+            layer[eid] = text
+        new = self.text(eid)
+        if old == new:
+            return
+        if old is not None:
+            self._unlink(eid, old)
+        if new is not None:
+            self._link(eid, new)
+
+    def update_emoji(self, rows: Iterable[Tuple[int, str]], removed: Iterable[int] = ()):
+        """Apply changes of `Emoji` table."""
+        for eid in removed:
+            self._put(self._emoji, eid, None)
+        for eid, text in rows:
+            self._put(self._emoji, eid, text)
+
+    def update_my(self, rows: Iterable[Tuple[int, str]]):
+        """Apply changes of `MyEmoji` table."""
+        for eid, text in rows:
+            self._put(self._my, eid, text)
+
+    def _prefixed(self, q: str) -> List[str]:
+        keys = []
+        i = bisect_left(self._keys, q)
+        while i < len(self._keys) and self._keys[i].startswith(q):
+            keys.append(self._keys[i])
+            i += 1
+        return keys
+
+    def _fuzzy(self, q: str, n: int) -> List[str]:
+        qchars = set(q)
+        shared: Dict[str, int] = defaultdict(int)
+        for c in qchars:
+            for key in self._chars.get(c, ()):
+                shared[key] += 1
+
+        def rank(key: str):
+            common = shared[key]
+            jaccard = common / (len(qchars) + self._nchars[key] - common)
+            return (-((q in key) + jaccard), len(key), key)
+
+        return heapq.nsmallest(n, shared, key=rank)
+
+    def search(self, text: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """Find emojis by text. Exact matches come first, then prefix matches (shorter first),
+        then fuzzy matches ranked by the characters shared with `text`. Matching is case
+        insensitive.
+
+        :param text: the text, or part of it, to search.
+        :param limit: max number of results.
+        :return: ``(eid, text)`` pairs.
+        """
+        q = normalize(text)
+        if not q or limit <= 0:
+            return []
+
+        result: List[Tuple[int, str]] = []
+        seen: Set[str] = set()
+
+        def take(keys: Iterable[str]) -> bool:
+            for key in keys:
+                if key in seen:
+                    continue
+                seen.add(key)
+                for eid in self._eids[key]:
+                    result.append((eid, self.text(eid) or key))
+                    if len(result) >= limit:
+                        return True
+            return False
+
+        if take([q] if q in self._eids else []):
+            return result
+        if take(sorted(self._prefixed(q), key=lambda k: (len(k), k))):
+            return result
+        take(self._fuzzy(q, limit - len(result) + len(seen)))
+        return result
@@ -0,0 +1,197 @@
+"""A compact, read-only snapshot of ``Emoji`` table. Reading it imports neither sqlalchemy nor
+sqlite, and it is mapped into memory with :mod:`mmap` so that processes on a host share its pages.
+
+Layout (little-endian)::
+
+    header   magic ``QZES``, version (u16), reserved (u16), count (u32), blob size (u32),
+             sha256 of the rows (32 bytes)
+    ids      count × i64, ascending
+    offsets  (count + 1) × u32, offsets of each text in blob
+    blob     utf-8 texts
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from hashlib import sha256
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from .orm import EmojiTable
+
+__all__ = ["Snapshot", "SnapshotTable", "write_snapshot", "dump_table"]
+
+MAGIC = b"QZES"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII32s")
+
+
+class _Writer:
+    """Pack rows sorted by eid into the arrays of a snapshot, as they come."""
+
+    def __init__(self) -> None:
+        self.ids = array("q")
+        self.offsets = array("I", [0])
+        self.blob = bytearray()
+        self._h = sha256()
+        self._sep = b""
+
+    def extend(self, rows: Iterable[Tuple[int, str]]):
+        for eid, text in rows:
+            b = text.encode("utf8")
+            self.ids.append(eid)
+            self.blob += b
+            self.offsets.append(len(self.blob))
+            # the same digest as orm.digest
+            self._h.update(self._sep + f"{eid}=".encode() + b)
+            self._sep = b";"
+
+    def write(self, path: Path) -> str:
+        ids, offsets = self.ids, self.offsets
+        if sys.byteorder != "little":
+            ids, offsets = array("q", ids), array("I", offsets)
+            ids.byteswap()
+            offsets.byteswap()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(ids), len(self.blob), self._h.digest()))
+            f.write(ids.tobytes())
+            f.write(offsets.tobytes())
+            f.write(self.blob)
+        os.replace(tmp, path)
+        return self._h.hexdigest().lower()
+
+
+def write_snapshot(path: Path, rows: Union[Mapping[int, str], Iterable[Tuple[int, str]]]) -> str:
+    """Write rows into a snapshot file. The file is replaced atomically.
+
+    :param path: the snapshot path.
+    :param rows: a mapping or ``(eid, text)`` pairs.
+    :return: sha256 of the rows, the same as :meth:`EmojiTable.sha256`.
+
+    .. versionadded:: 6.1.0
+    """
+    w = _Writer()
+    w.extend(sorted(rows.items() if isinstance(rows, Mapping) else rows))
+    return w.write(path)
+
+
+async def dump_table(table: "EmojiTable", path: Path) -> str:
+    """Write ``Emoji`` table of `table` into a snapshot file. Rows are streamed in eid order
+    and packed as they come, so they are never loaded as Python objects all at once.
+
+    :return: sha256 of ``Emoji`` table.
+
+    .. versionadded:: 6.1.0
+    """
+    w = _Writer()
+    async for rows in table._iter_batches("Emoji"):
+        w.extend(rows)
+    return w.write(path)
+
+
+class Snapshot:
+    """A memory-mapped snapshot file. Lookups are binary searches over the id array.
+
+    :param path: the snapshot path.
+
+    .. versionadded:: 6.1.0
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, n, blob_size, digest = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a snapshot of version {VERSION}")
+        self.sha256 = digest.hex()
+
+        mv = memoryview(self._mm)
+        start = HEADER.size
+        ids, offsets = mv[start : start + 8 * n], mv[start + 8 * n : start + 12 * n + 4]
+        self._blob = mv[start + 12 * n + 4 : start + 12 * n + 4 + blob_size]
+        if sys.byteorder == "little":
+            self._ids = ids.cast("q")
+            self._offsets = offsets.cast("I")
+        else:
+            self._ids, self._offsets = array("q", ids), array("I", offsets)
+            self._ids.byteswap()
+            self._offsets.byteswap()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, eid: int) -> bool:
+        i = bisect_left(self._ids, eid)
+        return i < len(self._ids) and self._ids[i] == eid
+
+    def get(self, eid: int) -> Optional[str]:
+        """Get the text of `eid`, or None if not found."""
+        i = bisect_left(self._ids, eid)
+        if i < len(self._ids) and self._ids[i] == eid:
+            return str(self._blob[self._offsets[i] : self._offsets[i + 1]], "utf8")
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        """Iterate over ``(eid, text)`` pairs in eid order."""
+        for i, eid in enumerate(self._ids):
+            yield eid, str(self._blob[self._offsets[i] : self._offsets[i + 1]], "utf8")
+
+    def close(self):
+        for mv in (self._ids, self._offsets, self._blob):
+            if isinstance(mv, memoryview):
+                mv.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SnapshotTable:
+    """Query a :class:`Snapshot` as the base layer, with `overrides` (e.g. rows of `MyEmoji`) on
+    top of it, just as `MyEmoji` takes priority over `Emoji` in :class:`EmojiTable`.
+
+    :param snapshot: the base layer.
+    :param overrides: customized texts, which take priority over the snapshot.
+
+    .. versionadded:: 6.1.0
+    """
+
+    def __init__(
+        self, snapshot: Snapshot, overrides: Optional[MutableMapping[int, str]] = None
+    ) -> None:
+        self.snapshot = snapshot
+        self.overrides = {} if overrides is None else overrides
+
+    def query(self, eid: int) -> Optional[str]:
+        text = self.overrides.get(eid)
+        if text is None:
+            return self.snapshot.get(eid)
+        return text
+
+    def query_many(self, eids: Iterable[int]) -> Dict[int, Optional[str]]:
+        return {eid: self.query(eid) for eid in dict.fromkeys(eids)}
+
+    def set(self, eid: int, text: str):
+        self.overrides[eid] = text
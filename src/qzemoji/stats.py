@@ -0,0 +1,113 @@
+"""Lightweight counters and latency histograms. Instrumentation is disabled by default;
+pass a :class:`Stats` to :class:`~qzemoji.orm.EmojiTable` or set :obj:`FindDB.stats
+<qzemoji.finddb.FindDB.stats>` to enable it."""
+
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0, 10.0)
+"""Upper bounds (in seconds) of latency buckets. The last bucket is unbounded."""
+
+
+class Histogram:
+    """A latency histogram with fixed buckets.
+
+    :param buckets: ascending upper bounds of buckets, in seconds.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(
+            buckets=list(self.buckets), counts=list(self.counts), count=self.count, sum=self.sum
+        )
+
+
+class Stats:
+    """Counters and per-operation latency histograms.
+
+    :param buckets: buckets of latency histograms.
+
+    .. versionadded:: 6.1.0
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.latency: Dict[str, Histogram] = {}
+        self.listeners: List[Callable[[str, float], Any]] = []
+        """Called with ``(operation, seconds)`` on every observed latency."""
+
+    def incr(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def observe(self, op: str, seconds: float):
+        hist = self.latency.get(op)
+        if hist is None:
+            hist = self.latency[op] = Histogram(self.buckets)
+        hist.observe(seconds)
+        for cb in self.listeners:
+            cb(op, seconds)
+
+    @contextmanager
+    def timer(self, op: str):
+        """Observe the time spent in the ``with`` block as the latency of `op`."""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(op, time.perf_counter() - t)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and histograms as plain dicts, e.g. for exporting to a metrics system."""
+        return dict(
+            counters=dict(self.counters),
+            latency={k: v.as_dict() for k, v in self.latency.items()},
+        )
+
+    def reset(self):
+        self.counters.clear()
+        self.latency.clear()
+
+
+async def observe(stats: Stats, op: str, aw: Awaitable[T]) -> T:
+    """Await `aw` and observe its latency as `op`."""
+    with stats.timer(op):
+        return await aw
+
+
+def timed(op: str):
+    """Decorate a coroutine method of an object with a ``stats`` attribute, so that its latency is
+    observed as `op`. If ``stats`` is None, the coroutine of the method is returned as it is,
+    so no extra coroutine is created."""
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @wraps(func)
+        def wrapper(self, *args, **kwds) -> Awaitable[T]:
+            stats: Optional[Stats] = self.stats
+            if stats is None:
+                return func(self, *args, **kwds)
+            return observe(stats, op, func(self, *args, **kwds))
+
+        return wrapper
+
+    return decorator
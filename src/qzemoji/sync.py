@@ -0,0 +1,125 @@
+"""Synchronous, thread-safe query interface backed by stdlib :mod:`sqlite3`.
+No event loop is needed, and changes made by the async :func:`qzemoji.set` are seen at once
+since the same database file is read.
+
+>>> import qzemoji.sync as qes
+>>> qes.query(400343)
+'🐷'
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import qzemoji as qe
+
+from .finddb import FindDB
+from .orm import IN_CHUNK
+
+__all__ = ["SyncEmojiTable", "init", "query", "query_many"]
+
+QUERY_SQL = (
+    "SELECT (SELECT text FROM MyEmoji WHERE eid = :eid), (SELECT text FROM Emoji WHERE eid = :eid)"
+)
+
+
+class SyncEmojiTable:
+    """Query `MyEmoji` and `Emoji` table synchronously. Each thread uses its own
+    read-only connection, so an instance can be shared among threads.
+
+    :param path: path to the database file.
+
+    .. versionadded:: 6.1.0
+    """
+
+    def __init__(self, path: Path) -> None:
+        if not path.exists():
+            raise FileNotFoundError(path)
+        self.path = path
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The connection of current thread."""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"file:{self.path.as_posix()}?mode=ro", uri=True, check_same_thread=False
+            )
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def query(self, eid: int) -> Optional[str]:
+        """Query an emoji ID. `MyEmoji` takes priority over `Emoji`.
+
+        :return: the text, or None if not found.
+        """
+        my, emoji = self.conn.execute(QUERY_SQL, dict(eid=eid)).fetchone()
+        return emoji if my is None else my
+
+    def query_many(self, eids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """Query a batch of emoji IDs, with one ``IN (...)`` query per table.
+
+        :return: a dict from each given id to its text, or None if not found. Keys keep the input order.
+        """
+        result: Dict[int, Optional[str]] = dict.fromkeys(eids)
+        todo = list(result)
+        for table in ("MyEmoji", "Emoji"):
+            for i in range(0, len(todo), IN_CHUNK):
+                chunk = todo[i : i + IN_CHUNK]
+                sql = f"SELECT eid, text FROM {table} WHERE eid IN ({','.join('?' * len(chunk))})"
+                result.update(self.conn.execute(sql, chunk))
+            todo = [i for i in todo if result[i] is None]
+        return result
+
+    def close(self):
+        """Close connections of all threads."""
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+            self._local = threading.local()
+
+
+_table: Optional[SyncEmojiTable] = None
+_init_lock = threading.Lock()
+
+
+def init(path: Optional[Path] = None) -> SyncEmojiTable:
+    """Init the package-level :class:`SyncEmojiTable`. It is called on the first query implicitly.
+    Calling it after the table is created has no effect.
+
+    :param path: use this database. Default to the database of the async singleton if it is
+        initialized, otherwise :obj:`FindDB.my_db`. The database is never downloaded here.
+    """
+    global _table
+    if _table is not None:
+        return _table
+
+    with _init_lock:
+        if _table is None:
+            if path is None:
+                if qe.__singleton__ is not None:
+                    database = qe.__singleton__.engine.url.database
+                    if not database:
+                        raise ValueError("in-memory database cannot be shared")
+                    path = Path(database)
+                else:
+                    path = FindDB.my_db
+            _table = SyncEmojiTable(path)
+    return _table
+
+
+def query(eid: int) -> Optional[str]:
+    """Synchronous version of :func:`qzemoji.query`. Auto update is not triggered."""
+    return init().query(eid)
+
+
+def query_many(eids: Iterable[int]) -> Dict[int, Optional[str]]:
+    """Synchronous version of :func:`qzemoji.query_many`. Auto update is not triggered."""
+    return init().query_many(eids)
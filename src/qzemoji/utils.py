@@ -1,11 +1,35 @@
 import re
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Union
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
 
 from yarl import URL
 
 import qzemoji as qe
 
+if TYPE_CHECKING:
+    from .orm import EmojiTable
+
+EMOJI_PATTERN = re.compile(
+    r"\[em\]e(\d+)\[/em\]|(?:(?:https?:)?//)?qzonestyle\.gtimg\.cn/qzone/em/e(\d+)\.\w+"
+)
+"""Matches an emoji tag (``[em]e400343[/em]``) or an emoji url (``http://qzonestyle.gtimg.cn/qzone/em/e400343.gif``).
+The emoji ID is captured by group 1 (tag) or group 2 (url)."""
+EMOJI_PATTERN_BYTES = re.compile(EMOJI_PATTERN.pattern.encode())
+"""Bytes version of :obj:`EMOJI_PATTERN`."""
+TAG_PATTERN = re.compile(r"\[em\]e(\d+)\[/em\]")
+PURE_EMOJI_PATTERN = re.compile(r"[^\u0000-\uFFFF]*")
+
 
 def resolve(*, url: Union[URL, str, None] = None, tag: Optional[str] = None):
     """
@@ -31,21 +55,53 @@ def resolve(*, url: Union[URL, str, None] = None, tag: Optional[str] = None):
     """
     assert (url is None) ^ (tag is None)
     if tag:
-        m = re.match(r"\[em\]e(\d+)\[/em\]", tag)
+        m = TAG_PATTERN.match(tag)
         if not m:
             raise ValueError(tag)
         name: str = m.group(1)
     else:
         assert url
         if isinstance(url, str):
-            url = URL(url)
-        name = Path(url.path).stem
+            # fast path: the stem of the last path segment, without building URL and Path
+            path = url.partition("?")[0].partition("#")[0]
+            name = path[path.rfind("/") + 1 :]
+            dot = name.rfind(".")
+            if dot > 0:
+                name = name[:dot]
+        else:
+            name = Path(url.path).stem
         if name.startswith("e"):
             # py39- has no removeprefix
             name = name[1:]
     return int(name)
 
 
+def iter_resolve(text: Union[str, bytes]) -> Iterator[int]:
+    """Extract every emoji ID from emoji tags and emoji urls in `text`, in one pass.
+
+    :param text: a (large) text or bytes buffer, e.g. crawled html.
+    :return: an iterator of emoji IDs, in the order they appear. Duplicated ids are kept.
+
+    >>> list(iter_resolve(b'<img src="http://qzonestyle.gtimg.cn/qzone/em/e400343.gif">[em]e125[/em]'))
+    [400343, 125]
+
+    .. versionadded:: 6.1.0
+    """
+    pattern = EMOJI_PATTERN_BYTES if isinstance(text, bytes) else EMOJI_PATTERN
+    for m in pattern.finditer(text):  # type: ignore
+        yield int(m.group(1) or m.group(2))
+
+
+def resolve_many(text: Union[str, bytes]) -> List[int]:
+    """Extract every emoji ID from `text`. Duplicated ids are removed, the first occurrence is kept.
+
+    .. seealso:: :meth:`iter_resolve`
+
+    .. versionadded:: 6.1.0
+    """
+    return list(dict.fromkeys(iter_resolve(text)))
+
+
 def build_html(eid: int, host: str = "qzonestyle.gtimg.cn", ext: str = "png"):
     return f"http://{host}/qzone/em/e{eid}.{ext}"
 
@@ -54,14 +110,19 @@ def build_tag(eid: int):
     return f"[em]e{eid}[/em]"
 
 
+@lru_cache(maxsize=4096)
 def wrap_plain_text(name: str, fmt="[/{name}]") -> str:
     """This function wraps the given `name` with the given `fmt`, if it is not a pure emoji word.
 
     :param name: the customized emoji name.
     :param fmt: a format string in ``{`` style, default as ``[/{name}]``.
     :return: The emoji itself if it is a pure emoji word, otherwise a string wrapped by the `fmt`.
+
+    .. versionchanged:: 6.1.0
+
+        results are memoized.
     """
-    if re.fullmatch(r"[^\u0000-\uFFFF]*", name):
+    if PURE_EMOJI_PATTERN.fullmatch(name):
         return name
     return fmt.format(name=name)
 
@@ -78,3 +139,91 @@ async def query_wrap(eid: int, fmt="[/{name}]") -> str:
     if name is None:
         return build_tag(eid)
     return wrap_plain_text(name, fmt=fmt)
+
+
+def _match_eid(m: "re.Match[str]") -> int:
+    return int(m.group(1) or m.group(2))
+
+
+async def translate_many(
+    texts: Iterable[str], fmt="[/{name}]", *, table: Optional["EmojiTable"] = None
+) -> List[str]:
+    """Replace every emoji tag and emoji url in `texts` with the wrapped emoji name.
+    Ids of all texts are looked up with one :func:`qzemoji.query_many` call.
+    Tags and urls whose id is not stored in the database are kept as is.
+
+    :param texts: texts to translate.
+    :param fmt: passed to :meth:`wrap_plain_text`.
+    :param table: look up in this table, default to the package singleton.
+    :return: translated texts, in the same order.
+
+    .. versionadded:: 6.1.0
+    """
+    texts = list(texts)
+    eids = {i for t in texts for i in iter_resolve(t)}
+    if not eids:
+        return texts
+    query_many = qe.query_many if table is None else table.query_many
+    names: Dict[int, Optional[str]] = await query_many(eids)
+
+    def repl(m: "re.Match[str]") -> str:
+        name = names[_match_eid(m)]
+        if name is None:
+            return m.group(0)
+        return wrap_plain_text(name, fmt=fmt)
+
+    return [EMOJI_PATTERN.sub(repl, t) for t in texts]
+
+
+async def translate(text: str, fmt="[/{name}]", *, table: Optional["EmojiTable"] = None) -> str:
+    """Replace every emoji tag and emoji url in `text` with the wrapped emoji name.
+
+    >>> await translate("[em]e400343[/em] http://qzonestyle.gtimg.cn/qzone/em/e125.gif")
+    '🐷 [/困]'
+
+    .. seealso:: :meth:`translate_many`
+
+    .. versionadded:: 6.1.0
+    """
+    return (await translate_many((text,), fmt=fmt, table=table))[0]
+
+
+async def translate_stream(
+    texts: Union[Iterable[str], AsyncIterable[str]],
+    chunk_size: int = 64,
+    fmt="[/{name}]",
+    *,
+    table: Optional["EmojiTable"] = None,
+) -> AsyncIterator[str]:
+    """Translate a stream of texts. Texts are grouped into chunks of `chunk_size`, and each chunk
+    costs one batched lookup.
+
+    :param texts: an (async) iterable of texts.
+    :param chunk_size: max number of texts translated at once.
+    :param fmt: passed to :meth:`wrap_plain_text`.
+    :param table: passed to :meth:`translate_many`.
+    :return: an async iterator of translated texts, in the same order.
+
+    .. seealso:: :meth:`translate_many`
+
+    .. versionadded:: 6.1.0
+    """
+    chunk: List[str] = []
+    if isinstance(texts, AsyncIterable):
+        async for t in texts:
+            chunk.append(t)
+            if len(chunk) >= chunk_size:
+                for r in await translate_many(chunk, fmt=fmt, table=table):
+                    yield r
+                chunk.clear()
+    else:
+        for t in texts:
+            chunk.append(t)
+            if len(chunk) >= chunk_size:
+                for r in await translate_many(chunk, fmt=fmt, table=table):
+                    yield r
+                chunk.clear()
+
+    if chunk:
+        for r in await translate_many(chunk, fmt=fmt, table=table):
+            yield r
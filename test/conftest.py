@@ -0,0 +1,17 @@
+import pytest_asyncio
+
+from qzemoji.base import AsyncEngineFactory
+from qzemoji.orm import EmojiOrm, EmojiTable
+
+EMOJI = {100: "微笑", 101: "撇嘴", 125: "困", 400343: "🐷"}
+
+
+@pytest_asyncio.fixture
+async def table():
+    """An in-memory :class:`EmojiTable` filled with :obj:`EMOJI`."""
+    async with AsyncEngineFactory.sqlite3(None) as engine:
+        tbl = EmojiTable(engine)
+        await tbl.create()
+        async with tbl.sess() as sess, sess.begin():
+            sess.add_all([EmojiOrm(eid=k, text=v) for k, v in EMOJI.items()])
+        yield tbl
@@ -1,4 +1,6 @@
 import asyncio
+import subprocess as sp
+import sys
 
 import pytest
 
@@ -11,3 +13,12 @@ async def test_async():
     qe.enable_auto_update = False
     done, _ = await asyncio.wait([asyncio.create_task(qe.query(i)) for i in range(100, 200)])
     assert len(done) == 100
+
+
+async def test_lazy_init():
+    r = sp.run(
+        [sys.executable, "-c", "import qzemoji as qe; assert qe.__singleton__ is None"],
+        capture_output=True,
+    )
+    assert not r.stderr
+    assert await qe.init() is await qe.init()
@@ -5,9 +5,11 @@ from pathlib import Path
 
 import pytest
 import yaml
+from conftest import EMOJI
 
 from qzemoji.base import AsyncEngineFactory
-from qzemoji.orm import EmojiTable
+from qzemoji.delta import Delta
+from qzemoji.orm import EmojiTable, digest
 
 pytestmark = pytest.mark.asyncio
 
@@ -35,3 +37,41 @@ async def test_build():
         assert h2 == await built.sha256()
 
     out.unlink()
+
+
+@pytest.mark.parametrize("suffix", [".yml", ".jsonl", ".csv"])
+async def test_roundtrip(table: EmojiTable, suffix: str):
+    await table.set(1, 'one, "quoted"\nline')
+    await table.set(100, "hello")
+    src = await table.export(Path(f"tmp/export{suffix}"))
+    expected = {**EMOJI, 1: 'one, "quoted"\nline', 100: "hello"}
+
+    r = sp.run(
+        [sys.executable, "script/build.py", src, "-o", "tmp/roundtrip.db"], capture_output=True
+    )
+    assert not r.stderr
+    async with AsyncEngineFactory.sqlite3(Path("tmp/roundtrip.db")) as engine:
+        built = EmojiTable(engine)
+        assert await built.query_many(expected) == expected
+        assert await built.sha256() == digest(sorted(expected.items()))
+
+    src.unlink()
+    Path("tmp/roundtrip.db").unlink()
+
+
+async def test_delta(tmp_path: Path):
+    old = tmp_path / "old.yml"
+    old.write_text(yaml.safe_dump({100: "微笑", 1: "one"}, allow_unicode=True), encoding="utf8")
+    src = tmp_path / "new.yml"
+    src.write_text(yaml.safe_dump(EMOJI, allow_unicode=True), encoding="utf8")
+
+    r = sp.run(
+        [sys.executable, "script/build.py", src, "-o", tmp_path / "emoji.db", "-d", old],
+        capture_output=True,
+    )
+    assert r.returncode == 0
+    (path,) = tmp_path.glob("emoji-*.delta.json")
+    delta = Delta.loads(path.read_text(encoding="utf8"))
+    assert delta.to_sha256 == r.stdout.decode().strip()
+    assert delta.remove == (1,)
+    assert delta.apply({100: "微笑", 1: "one"}) == EMOJI
@@ -0,0 +1,160 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from conftest import EMOJI
+from sqlalchemy import select
+
+from qzemoji.base import AsyncEngineFactory
+from qzemoji.cache import MISSING, LRUCache
+from qzemoji.orm import EmojiTable, MyEmoji
+from qzemoji.stats import Stats
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_lru():
+    c = LRUCache(2)
+    c[1], c[2] = "a", "b"
+    assert c.get(1) == "a"
+    c[3] = "c"
+    assert 2 not in c
+    assert c.get(2) is MISSING
+    assert c.info()[:2] == (1, 1)
+
+
+async def test_hit(table: EmojiTable):
+    assert await table.query(100) == "微笑"
+    assert await table.query(100) == "微笑"
+    info = table.cache_info()
+    assert info.hits == 1
+    assert info.currsize == 1
+
+
+async def test_write_through(table: EmojiTable):
+    assert await table.query(100) == "微笑"
+    await table.set(100, "hello")
+    assert await table.query(100) == "hello"
+    assert table.cache_info().hits == 1
+
+
+async def test_preload(table: EmojiTable):
+    await table.preload()
+    assert table.cache_info().currsize == 4
+    assert await table.query(125) == "困"
+    assert await table.query(1) is None
+    await table.set(1, "one")
+    assert await table.query(1) == "one"
+
+
+async def test_query_many(table: EmojiTable):
+    await table.set(101, "hello")
+    assert await table.query(125) == "困"
+    r = await table.query_many([100, 101, 1, 125, 100])
+    assert r == {100: "微笑", 101: "hello", 1: None, 125: "困"}
+    assert list(r) == [100, 101, 1, 125]
+    assert table.cache_info().hits == 2
+
+
+async def test_negative(table: EmojiTable):
+    assert await table.query(1) is None
+    assert await table.query_many([1, 2]) == {1: None, 2: None}
+    assert table.negative.hits == 1
+    assert await table.query(2) is None
+    assert table.negative.hits == 2
+
+    await table.set(1, "one")
+    assert await table.query(1) == "one"
+
+
+async def test_negative_ttl(table: EmojiTable):
+    table.negative.ttl = 0.01
+    assert await table.query(1) is None
+    await asyncio.sleep(0.02)
+    assert 1 not in table.negative
+
+
+async def test_set_many(table: EmojiTable):
+    assert await table.query(1) is None
+    await table.set_many({1: "one", 100: "hello"})
+    assert await table.query_many([1, 100, 101]) == {1: "one", 100: "hello", 101: "撇嘴"}
+    table.cache.clear()
+    assert await table.query_many([1, 100]) == {1: "one", 100: "hello"}
+
+
+async def test_write_behind(table: EmojiTable):
+    table.write_behind = 3600
+    table.cache.maxsize = 0
+    await table.set(1, "one")
+    await table.set(100, "hello")
+    assert await table.query(1) == "one"
+    assert await table.query_many([1, 100]) == {1: "one", 100: "hello"}
+    async with table.engine.connect() as conn:
+        assert (await conn.execute(select(MyEmoji))).all() == []
+
+    await table.flush()
+    assert not table._pending
+    async with table.engine.connect() as conn:
+        assert len((await conn.execute(select(MyEmoji))).all()) == 2
+
+    table.write_behind = 0.01
+    await table.set(101, "hi")
+    assert table._flush_task
+    await table._flush_task
+    assert not table._pending
+    assert await table.query(101) == "hi"
+
+
+async def test_write_behind_then_set_many(table: EmojiTable):
+    async def stored():
+        async with table.engine.connect() as conn:
+            return dict((await conn.execute(select(MyEmoji.eid, MyEmoji.text))).all())
+
+    table.write_behind = 3600
+    await table.set(1, "older")
+    await table.set_many({1: "newer"})
+    assert await table.query(1) == "newer"
+    await table.flush()
+    assert await stored() == {1: "newer"}
+
+    # a flush in flight holds the older text
+    await table.set(1, "oldest")
+    await asyncio.gather(table.flush(), table.set_many({1: "latest"}))
+    await table.flush()
+    assert await table.query(1) == "latest"
+    assert await stored() == {1: "latest"}
+    assert not table._pending
+
+
+async def test_cross_process(tmp_path: Path):
+    db = tmp_path / "shared.db"
+    async with AsyncEngineFactory.sqlite3(db) as e1, AsyncEngineFactory.sqlite3(db) as e2:
+        writer = EmojiTable(e1)
+        await writer.update_items(EMOJI)
+        reader = EmojiTable(e2, check_interval=3600)
+        assert await reader.query(400343) == "🐷"
+
+        await writer.set(400343, "pig")
+        assert await reader.query(400343) == "🐷"  # stale within the interval
+        assert await reader.check_version()
+        assert await reader.query(400343) == "pig"
+
+        # own writes do not drop the cache
+        await reader.set(100, "smile")
+        assert not await reader.check_version()
+        assert reader.cache_info().currsize == 2
+
+        # checked every second by default
+        default = EmojiTable(e2)
+        assert await default.query(125) == "困"
+        await writer.set(125, "sleepy")
+        await asyncio.sleep(1.05)
+        assert await default.query(125) == "sleepy"
+
+
+async def test_coalesce(table: EmojiTable):
+    table.stats = stats = Stats()
+    texts = await asyncio.gather(*(table.query(i) for i in [100, 100, 125, 1, 100]))
+    assert texts == ["微笑", "微笑", "困", None, "微笑"]
+    assert stats.counters["query.coalesced"] == 2
+    assert stats.latency["query.db"].count == 1
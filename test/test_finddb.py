@@ -0,0 +1,276 @@
+import asyncio
+import socket
+from pathlib import Path
+from typing import Optional
+
+import pytest
+import pytest_asyncio
+from aiohttp import ClientError, web
+from conftest import EMOJI
+from sqlalchemy.exc import OperationalError
+
+import qzemoji as qe
+from qzemoji.base import AsyncEngineFactory
+from qzemoji.delta import Delta
+from qzemoji.finddb import FindDB
+from qzemoji.orm import EmojiOrm, EmojiTable, digest
+from qzemoji.refresh import Refresher
+from qzemoji.stats import Stats
+
+pytestmark = pytest.mark.asyncio
+
+
+class StandIn:
+    """A local stand-in of the index page and the release asset."""
+
+    def __init__(self, db: Path, sha256: str) -> None:
+        self.db = db
+        self.sha256 = sha256
+        self.requests = []
+        self.delta: Optional[Delta] = None
+        self.broken = False
+
+    async def index(self, request: web.Request):
+        self.requests.append(request)
+        if request.headers.get("If-None-Match") == '"index"':
+            return web.Response(status=304)
+        if self.broken:
+            return web.Response(text="<html>maintenance</html>")
+        href = f"{request.url.origin()}/emoji.db#sha256={self.sha256}"
+        text = f'<a href="{href}">emoji.db</a>'
+        if self.delta:
+            d = self.delta
+            href = f"{request.url.origin()}/emoji.delta.json#from={d.from_sha256}&to={d.to_sha256}"
+            text += f'\n<a href="{href}">emoji.delta</a>'
+        return web.Response(text=text, headers={"ETag": '"index"'})
+
+    async def delta_json(self, request: web.Request):
+        self.requests.append(request)
+        assert self.delta
+        return web.Response(text=self.delta.dumps())
+
+    async def emoji(self, request: web.Request):
+        self.requests.append(request)
+        return web.FileResponse(self.db)
+
+
+@pytest_asyncio.fixture
+async def server(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    db = tmp_path / "release.db"
+    async with AsyncEngineFactory.sqlite3(db) as engine:
+        tbl = EmojiTable(engine)
+        await tbl.create()
+        async with tbl.sess() as sess, sess.begin():
+            sess.add_all([EmojiOrm(eid=k, text=v) for k, v in EMOJI.items()])
+        await tbl.sha256(verify=True)
+
+    stand_in = StandIn(db, digest(sorted(EMOJI.items())))
+    app = web.Application()
+    app.router.add_get("/index.html", stand_in.index)
+    app.router.add_get("/emoji.db", stand_in.emoji)
+    app.router.add_get("/emoji.delta.json", stand_in.delta_json)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    monkeypatch.setattr(FindDB, "index_url", f"http://127.0.0.1:{port}/index.html")
+    monkeypatch.setattr(FindDB, "predefined", tmp_path / "data/emoji.db")
+    monkeypatch.setattr(FindDB, "my_db", tmp_path / "data/myemoji.db")
+    monkeypatch.setattr(FindDB, "validators", tmp_path / "data/emoji.http.json")
+    monkeypatch.setattr(FindDB, "delta", tmp_path / "data/emoji.delta.json")
+    yield stand_in
+    await runner.cleanup()
+
+
+async def test_download(server: StandIn, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(FindDB, "stats", Stats())
+    assert await FindDB.download()
+    assert FindDB.stats and FindDB.stats.counters["download.bytes"] == server.db.stat().st_size
+    assert FindDB.predefined.read_bytes() == server.db.read_bytes()
+    assert not FindDB.predefined.with_name("emoji.db.part").exists()
+
+    FindDB.predefined.rename(FindDB.my_db)
+    n = len(server.requests)
+    assert not await FindDB.download()
+    assert len(server.requests) == n + 1
+    assert FindDB.stats.counters["download.not_modified"] == 1
+    assert FindDB.stats.latency["download"].count == 2
+    assert server.requests[-1].headers["If-None-Match"] == '"index"'
+
+
+async def test_uptodate(server: StandIn):
+    assert await FindDB.find() == FindDB.my_db
+    FindDB.validators.unlink()
+    assert not await FindDB.download()
+    assert not FindDB.predefined.exists()
+
+
+async def test_resume(server: StandIn):
+    assert await FindDB.download()
+    FindDB.predefined.unlink()
+
+    part = FindDB.predefined.with_name("emoji.db.part")
+    content = server.db.read_bytes()
+    part.write_bytes(content[:1000])
+    assert await FindDB.download(buffer_size=512)
+    assert server.requests[-1].headers["Range"] == "bytes=1000-"
+    assert FindDB.predefined.read_bytes() == content
+
+
+async def test_mismatch(server: StandIn):
+    server.sha256 = "0" * 64
+    with pytest.raises(ValueError):
+        await FindDB.download()
+    assert not FindDB.predefined.exists()
+    assert not FindDB.predefined.with_name("emoji.db.part").exists()
+
+
+async def test_refresher(server: StandIn, table: EmojiTable):
+    await table.set(1, "one")
+    async with AsyncEngineFactory.sqlite3(None) as mem:
+        empty = EmojiTable(mem)
+        await empty.create()
+        await table.update(mem)
+    assert await table.query(100) is None
+
+    refresher = Refresher(table, interval=3600)
+    refresher.start()
+    for _ in range(100):
+        if await table.query(100):
+            break
+        await asyncio.sleep(0.01)
+    assert refresher.running
+    await refresher.stop()
+    assert not refresher.running
+
+    assert await table.query(100) == EMOJI[100]
+    assert await table.query(1) == "one"
+    assert not FindDB.predefined.exists()
+
+
+async def test_refresh_behind(server: StandIn, table: EmojiTable):
+    # my_db is up to date, but the refreshed table is not
+    assert await FindDB.find() == FindDB.my_db
+    async with AsyncEngineFactory.sqlite3(None) as mem:
+        old = EmojiTable(mem)
+        await old.create()
+        async with old.sess() as sess, sess.begin():
+            sess.add_all([EmojiOrm(eid=k, text=v) for k, v in {**EMOJI, 100: "smile"}.items()])
+        await table.update(mem)
+
+    summary = await Refresher(table).refresh()
+    assert summary and summary.changed == (100,)
+    assert await table.query(100) == EMOJI[100]
+    assert await table.sha256() == server.sha256
+    assert await Refresher(table).refresh() is None
+
+
+async def test_refresh_behind_corrupt_delta(server: StandIn, table: EmojiTable):
+    assert await FindDB.find() == FindDB.my_db
+    old = {**EMOJI, 100: "smile"}
+    await table.update_items(old)
+    server.delta = Delta.compare(old, EMOJI)._replace(change={100: "grin"})
+
+    # the delta fails, and the whole database is downloaded for this table
+    summary = await Refresher(table).refresh()
+    assert summary and summary.changed == (100,)
+    assert await table.query(100) == EMOJI[100]
+    assert await table.sha256() == server.sha256
+
+
+async def test_apply_vanished(server: StandIn, table: EmojiTable, monkeypatch: pytest.MonkeyPatch):
+    # another process removes the database between exists() and opening it
+    exists = Path.exists
+    with monkeypatch.context() as m:
+        m.setattr(Path, "exists", lambda self: self == FindDB.predefined or exists(self))
+        with pytest.raises(OperationalError):
+            await FindDB.apply(table)
+    assert not FindDB.predefined.exists()
+    assert await table.query(100) == EMOJI[100]
+
+
+async def test_single_flight(server: StandIn, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(FindDB, "stats", Stats())
+    paths = await asyncio.gather(*(FindDB.find() for _ in range(5)))
+    assert paths == [FindDB.my_db] * 5
+    assert len(server.requests) == 2  # one index and one database
+    assert FindDB.stats and FindDB.stats.counters["find.coalesced"] == 4
+
+
+@pytest.mark.parametrize("corrupt", [False, True])
+async def test_delta(server: StandIn, corrupt: bool):
+    old = {**EMOJI, 1: "one", 100: "smile"}
+    del old[125]
+    server.delta = Delta.compare(old, EMOJI)
+    if corrupt:
+        server.delta = server.delta._replace(add={125: "sleepy"})
+
+    async with AsyncEngineFactory.sqlite3(FindDB.my_db) as engine:
+        local = EmojiTable(engine)
+        await local.update_items(old)
+        await local.set(1, "mine")
+
+        assert await FindDB.download()
+        assert FindDB.delta.exists()
+        assert not FindDB.predefined.exists()
+
+        summary = await FindDB.apply(local)
+        assert summary == ((125,), (100,), (1,))
+        assert await local.sha256() == server.sha256
+        assert await local.query(1) == "mine"
+        assert not FindDB.delta.exists()
+        assert not FindDB.predefined.exists()
+
+    db_requests = [r for r in server.requests if r.path == "/emoji.db"]
+    assert bool(db_requests) == corrupt
+
+
+async def test_index_error(server: StandIn, monkeypatch: pytest.MonkeyPatch):
+    async with AsyncEngineFactory.sqlite3(FindDB.my_db) as engine:
+        local = EmojiTable(engine)
+        await local.update_items({100: "NEW", 101: "x"})
+
+        server.broken = True
+        assert not await FindDB.download()
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        monkeypatch.setattr(FindDB, "index_url", f"http://127.0.0.1:{port}/index.html")
+        with pytest.raises(ClientError):
+            await FindDB.download()
+
+        assert not FindDB.predefined.exists()
+        assert await FindDB.apply(local) is None
+        assert await local.query_many([100, 101]) == {100: "NEW", 101: "x"}
+
+
+async def test_auto_update_custom(
+    server: StandIn, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    custom = tmp_path / "custom.db"
+    async with AsyncEngineFactory.sqlite3(custom) as engine:
+        mine = EmojiTable(engine)
+        await mine.create()
+        await mine.set(100, "mine")
+    monkeypatch.setattr(qe, "__singleton__", None)
+    monkeypatch.setattr(qe, "_updating", None)
+    monkeypatch.setattr(qe, "enable_auto_update", True)
+    tbl = await qe.init(custom)
+
+    fallback = FindDB.index_url.replace("index.html", "emoji.db")
+    monkeypatch.setattr("qzemoji.finddb.FALLBACK_DB", fallback)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(FindDB, "index_url", f"http://127.0.0.1:{port}/index.html")
+    try:
+        # my_db does not exist, but the singleton must not be rolled back to the fallback
+        with pytest.raises(ClientError):
+            await qe.auto_update()
+        assert not FindDB.predefined.exists()
+        assert await qe.query(100) == "mine"
+    finally:
+        await tbl.engine.dispose()
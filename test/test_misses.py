@@ -0,0 +1,85 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+import yaml
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from qzemoji.misses import MissCollector
+from qzemoji.orm import EmojiTable, MissedEmoji
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_top():
+    c = MissCollector(width=64, top_k=3)
+    for eid in range(1000):
+        c.add(eid)
+    for n, eid in enumerate((7, 8, 9)):
+        c.add(eid, 100 * (n + 1))
+    assert [eid for eid, _ in c.top()] == [9, 8, 7]
+    assert c.estimate(9) >= 301
+    assert c.total == 1600
+
+
+async def test_export(tmp_path: Path):
+    c = MissCollector()
+    c.add(2, 3)
+    c.add(1)
+    path = c.export(tmp_path / "missed.yml")
+    assert yaml.safe_load(path.read_text()) == {1: None, 2: None}
+    assert "missed 3 times" in path.read_text()
+
+
+async def test_flush(table: EmojiTable):
+    async def missed():
+        async with table.engine.connect() as conn:
+            return dict((await conn.execute(select(MissedEmoji.eid, MissedEmoji.count))).all())
+
+    table.misses = MissCollector(interval=None)
+    await table.query(1)
+    await table.query_many([1, 2, 100])
+    await table.flush_misses()
+    assert await missed() == {1: 2, 2: 1}
+
+    await table.query(2)
+    await table.flush_misses()
+    assert await missed() == {1: 2, 2: 2}
+
+    # flush is scheduled once the collector is due
+    table.misses.interval = 0
+    await table.query(3)
+    await asyncio.sleep(0.1)
+    assert (await missed())[3] == 1
+
+
+async def test_flush_error(table: EmojiTable, caplog: pytest.LogCaptureFixture):
+    async with table.engine.begin() as conn:
+        await conn.exec_driver_sql("DROP TABLE MissedEmoji")
+        await conn.exec_driver_sql("CREATE VIEW MissedEmoji AS SELECT 1 AS eid, 1 AS count")
+
+    table.misses = MissCollector(interval=None)
+    await table.query(1)
+    await table.query_many([1, 2])
+    with pytest.raises(OperationalError):
+        await table.flush_misses()
+    assert table.misses.top() == [(1, 2), (2, 1)]
+
+    # a failed background flush is logged, not left unretrieved
+    table.misses.interval = 0
+    await table.query(3)
+    assert table._misses_task
+    await asyncio.wait([table._misses_task])
+    assert "Failed to flush missed emoji ids" in caplog.text
+    assert table.misses.estimate(3) == 1
+
+
+async def test_miss_during_flush(table: EmojiTable):
+    table.misses = MissCollector(interval=None)
+    await table.query(1)
+    task = asyncio.create_task(table.flush_misses())
+    await asyncio.sleep(0)  # the flush is writing
+    await table.query(5)
+    await task
+    assert table.misses.top() == [(5, 1)]
@@ -0,0 +1,36 @@
+import pytest
+from conftest import EMOJI
+
+from qzemoji.base import AsyncEngineFactory
+from qzemoji.orm import EmojiTable
+from qzemoji.search import ReverseIndex
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_index():
+    index = ReverseIndex()
+    index.update_emoji([(100, "微笑"), (101, "微微一笑"), (102, "笑哭"), (103, "Smile")])
+    assert index.search("微笑") == [(100, "微笑"), (101, "微微一笑"), (102, "笑哭")]
+    assert index.search("微", limit=2) == [(100, "微笑"), (101, "微微一笑")]
+    assert index.search("smi") == [(103, "Smile")]
+    assert index.search("") == []
+
+    index.update_my([(102, "微哭")])
+    assert index.search("微") == [(102, "微哭"), (100, "微笑"), (101, "微微一笑")]
+    index.update_emoji([], removed=[100, 102])
+    assert (100, "微笑") not in index.search("微笑")
+    assert (102, "微哭") in index.search("微")
+
+
+async def test_search(table: EmojiTable):
+    assert await table.search("微") == [(100, "微笑")]
+    assert await table.search("🐷") == [(400343, "🐷")]
+
+    await table.set(125, "微困")
+    assert await table.search("微") == [(125, "微困"), (100, "微笑")]
+
+    async with AsyncEngineFactory.sqlite3(None) as mem:
+        await EmojiTable(mem).update_items({**EMOJI, 102: "微微一笑"})
+        await table.update(mem)
+    assert (await table.search("微微"))[0] == (102, "微微一笑")
@@ -0,0 +1,67 @@
+import subprocess as sp
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+from conftest import EMOJI
+
+from qzemoji.orm import EmojiTable, digest
+from qzemoji.snapshot import Snapshot, SnapshotTable, dump_table, write_snapshot
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_snapshot(tmp_path: Path):
+    path = tmp_path / "emoji.snap"
+    h = write_snapshot(path, EMOJI)
+    assert h == digest(sorted(EMOJI.items()))
+
+    with Snapshot(path) as snap:
+        assert len(snap) == len(EMOJI)
+        assert snap.sha256 == h
+        for k, v in EMOJI.items():
+            assert k in snap
+            assert snap.get(k) == v
+        assert snap.get(1) is None
+        assert snap.get(1 << 40) is None
+        assert dict(snap.items()) == EMOJI
+
+        tbl = SnapshotTable(snap, {100: "hello"})
+        tbl.set(1, "one")
+        assert tbl.query_many([100, 101, 1, 2]) == {
+            100: "hello",
+            101: EMOJI[101],
+            1: "one",
+            2: None,
+        }
+
+
+async def test_dump_table(table: EmojiTable, tmp_path: Path):
+    path = tmp_path / "emoji.snap"
+    assert await dump_table(table, path) == await table.sha256()
+    with Snapshot(path) as snap:
+        assert dict(snap.items()) == EMOJI
+
+
+async def test_build():
+    r = sp.run(
+        [sys.executable, "script/build.py", "-f", "snapshot", "-o", "tmp/build"],
+        capture_output=True,
+    )
+    assert not r.stderr
+
+    with open("data/emoji.yml", encoding="utf8") as f:
+        d = yaml.safe_load(f)
+    with Snapshot(Path("tmp/build.snap")) as snap:
+        assert snap.sha256 == r.stdout.decode().rstrip()
+        assert dict(snap.items()) == d
+    Path("tmp/build.snap").unlink()
+
+
+async def test_import_light():
+    code = (
+        "import sys, qzemoji.snapshot; assert 'sqlalchemy' not in sys.modules, sys.modules.keys()"
+    )
+    r = sp.run([sys.executable, "-c", code], capture_output=True)
+    assert not r.stderr
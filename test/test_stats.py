@@ -0,0 +1,45 @@
+import pytest
+
+from qzemoji.orm import EmojiTable
+from qzemoji.stats import Histogram, Stats
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_histogram():
+    h = Histogram((0.1, 1))
+    for i in (0.05, 0.5, 5, 0.1):
+        h.observe(i)
+    assert h.counts == [2, 1, 1]
+    assert h.count == 4
+
+
+async def test_table(table: EmojiTable):
+    table.stats = stats = Stats()
+    seen = []
+    stats.listeners.append(lambda op, t: seen.append(op))
+
+    await table.set(101, "hello")
+    assert await table.query(101) == "hello"
+    await table.query(100)
+    await table.query(1)
+    await table.query(1)
+    await table.query_many([100, 125, 2])
+
+    assert stats.counters == {"query.cache": 2, "query.emoji": 2, "query.miss": 3}
+    snap = stats.snapshot()
+    assert snap["latency"]["query"]["count"] == 4
+    assert snap["latency"]["query.db"]["count"] == 2
+    assert snap["latency"]["set"]["count"] == 1
+    assert seen.count("query_many") == 1
+
+
+async def test_disabled(table: EmojiTable):
+    assert table.stats is None
+    # no timing layer at all: the coroutines are those of the undecorated methods
+    coro = table.query(100)
+    assert coro.cr_code is EmojiTable._query.__code__
+    assert await coro == "微笑"
+    coro = table.set(101, "hello")
+    assert coro.cr_code is EmojiTable.set.__wrapped__.__code__
+    await coro
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from conftest import EMOJI
+
+from qzemoji.base import AsyncEngineFactory
+from qzemoji.orm import EmojiTable
+from qzemoji.sync import SyncEmojiTable
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_sync(tmp_path: Path):
+    db = tmp_path / "emoji.db"
+    async with AsyncEngineFactory.sqlite3(db) as engine:
+        tbl = EmojiTable(engine)
+        await tbl.create()
+        await tbl.update_items(EMOJI)
+
+        sync = SyncEmojiTable(db)
+        assert sync.query(100) == EMOJI[100]
+        assert sync.query(1) is None
+
+        await tbl.set(100, "hello")
+        await tbl.set(1, "one")
+        assert sync.query(100) == "hello"
+        assert sync.query_many([1, 125, 2, 1]) == {1: "one", 125: EMOJI[125], 2: None}
+
+        with ThreadPoolExecutor(4) as pool:
+            r = list(pool.map(sync.query, [100, 101, 125, 400343] * 4))
+        assert r == ["hello", EMOJI[101], EMOJI[125], EMOJI[400343]] * 4
+        sync.close()
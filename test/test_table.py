@@ -1,13 +1,21 @@
+import ast
+import asyncio
+import inspect
 from pathlib import Path
 
 import pytest
+import sqlalchemy as sa
 import yaml
+from conftest import EMOJI
+from sqlalchemy import select
+from yarl import URL
 
 import qzemoji as qe
 import qzemoji.utils as qeu
 from qzemoji.base import AsyncEngineFactory
+from qzemoji.delta import Delta
 from qzemoji.finddb import FindDB
-from qzemoji.orm import EmojiTable
+from qzemoji.orm import META_SHA256, EmojiOrm, EmojiTable, Meta, UpdateSummary, digest
 
 pytestmark = pytest.mark.asyncio
 
@@ -17,6 +25,14 @@ async def test_resolve():
     assert 400343 == qeu.resolve(tag="[em]e400343[/em]")
     pytest.raises(AssertionError, qeu.resolve, url="", tag="")
     pytest.raises(ValueError, qeu.resolve, tag="[em] e400343[/em]")
+    assert 400343 == qeu.resolve(url="//qzonestyle.gtimg.cn/qzone/em/e400343.gif?t=1#x")
+    assert 400343 == qeu.resolve(url=URL("http://qzonestyle.gtimg.cn/qzone/em/e400343.gif"))
+
+
+async def test_resolve_many():
+    text = '[em]e125[/em]<img src="http://qzonestyle.gtimg.cn/qzone/em/e400343.gif">[em]e125[/em]'
+    assert list(qeu.iter_resolve(text)) == [125, 400343, 125]
+    assert qeu.resolve_many(text.encode()) == [125, 400343]
 
 
 async def test_autoUpdate():
@@ -76,3 +92,166 @@ async def test_export():
     for k, v in d.items():
         assert isinstance(k, int)
         assert isinstance(v, str)
+
+
+async def test_stub():
+    """The stub of the singleton methods should follow :class:`EmojiTable`."""
+    stub = Path(qe.__file__).with_suffix(".pyi").read_text(encoding="utf8")
+    stubs = {f.name: f for f in ast.parse(stub).body if isinstance(f, ast.AsyncFunctionDef)}
+    for name in ["query", "query_many", "set", "set_many", "export", "search"]:
+        args = stubs[name].args
+        params = list(inspect.signature(getattr(EmojiTable, name)).parameters.values())[1:]
+        assert [a.arg for a in args.args] == [p.name for p in params], name
+        defaults = [ast.literal_eval(d) for d in args.defaults]
+        assert defaults == [p.default for p in params if p.default is not p.empty], name
+
+
+async def test_query_many():
+    r = await qe.query_many([400343, 125, 1, 400343])
+    assert r == {400343: await qe.query(400343), 125: await qe.query(125), 1: None}
+
+
+async def test_translate(table: EmojiTable):
+    pig, sleepy = qeu.wrap_plain_text(EMOJI[400343]), qeu.wrap_plain_text(EMOJI[125])
+    text = '[em]e400343[/em]<img src="http://qzonestyle.gtimg.cn/qzone/em/e125.gif">[em]e1[/em]'
+    expected = f'{pig}<img src="{sleepy}">[em]e1[/em]'
+    assert await qeu.translate(text, table=table) == expected
+    assert await qeu.translate("no emoji", table=table) == "no emoji"
+
+    async def texts():
+        for t in [text, "no emoji", text]:
+            yield t
+
+    r = [t async for t in qeu.translate_stream(texts(), chunk_size=2, table=table)]
+    assert r == [expected, "no emoji", expected]
+
+
+async def test_update_diff(table: EmojiTable):
+    assert await table.query(101) == "撇嘴"
+    assert await table.query(125) == "困"
+    await table.set(125, "hello")
+
+    async with AsyncEngineFactory.sqlite3(None) as mem:
+        new = EmojiTable(mem)
+        await new.create()
+        async with new.sess() as sess, sess.begin():
+            sess.add_all([EmojiOrm(eid=100, text="微笑"), EmojiOrm(eid=101, text="changed")])
+            sess.add_all([EmojiOrm(eid=125, text="困"), EmojiOrm(eid=102, text="色")])
+        summary = await table.update(mem)
+
+    assert summary == UpdateSummary(added=(102,), changed=(101,), removed=(400343,))
+    assert await table.query(101) == "changed"
+    assert await table.query(102) == "色"
+    assert await table.query(125) == "hello"
+    assert await table.query(400343) is None
+
+
+async def test_apply_delta(table: EmojiTable):
+    new = {**EMOJI, 1: "one", 101: "changed"}
+    del new[125]
+    delta = Delta.compare(EMOJI, new)
+    # a no-op entry and a removal of an unknown id are harmless
+    delta = delta._replace(change={**delta.change, 100: EMOJI[100]}, remove=(2,) + delta.remove)
+
+    with pytest.raises(ValueError):
+        await table.apply_delta(delta._replace(add={1: "uno"}))
+    assert [r async for r in table.iter_rows()] == sorted(EMOJI.items())
+
+    summary = await table.apply_delta(delta)
+    assert summary == UpdateSummary(added=(1,), changed=(101,), removed=(125,))
+    assert [r async for r in table.iter_rows()] == sorted(new.items())
+    assert await table.sha256(verify=True) == delta.to_sha256
+
+    with pytest.raises(ValueError):
+        await table.apply_delta(delta)
+
+
+async def test_iter_rows(table: EmojiTable):
+    await table.set_many({1: "one", 125: "hello"})
+    assert [r async for r in table.iter_rows(batch=2)] == sorted(EMOJI.items())
+    assert [r async for r in table.iter_rows("MyEmoji")] == [(1, "one"), (125, "hello")]
+    merged = sorted({**EMOJI, 1: "one", 125: "hello"}.items())
+    assert [r async for r in table.iter_rows("merged", batch=1)] == merged
+    with pytest.raises(ValueError):
+        [r async for r in table.iter_rows("Unknown")]
+
+
+async def test_sha256_stored(table: EmojiTable):
+    h = await table.sha256(verify=True)
+    assert h == digest(sorted(EMOJI.items()))
+    async with table.sess() as sess:
+        assert await sess.scalar(select(Meta.value).where(Meta.key == META_SHA256)) == h
+        await sess.execute(sa.update(Meta).values(value="stale"))
+        await sess.commit()
+    assert await table.sha256() == "stale"
+    assert await table.sha256(verify=True) == h
+    assert await table.sha256() == h
+
+
+async def test_sha256_read_only(tmp_path: Path):
+    db = tmp_path / "release.db"
+    async with AsyncEngineFactory.sqlite3(db) as engine:
+        await EmojiTable(engine).update_items(EMOJI)
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("DROP TABLE Meta")
+
+    async with AsyncEngineFactory.sqlite3(db, read_only=True) as engine:
+        tbl = EmojiTable(engine)
+        assert await tbl.sha256() == digest(sorted(EMOJI.items()))
+        assert await tbl.sha256(verify=True) == digest(sorted(EMOJI.items()))
+
+
+async def test_engine_profile(tmp_path: Path):
+    db = tmp_path / "profile.db"
+    async with AsyncEngineFactory.sqlite3(db) as engine:
+        await EmojiTable(engine).update_items(EMOJI)
+        async with engine.connect() as conn:
+            assert await conn.scalar(sa.text("PRAGMA journal_mode")) == "wal"
+            assert await conn.scalar(sa.text("PRAGMA synchronous")) == 1
+
+    async with AsyncEngineFactory.sqlite3(db, read_only=True) as engine:
+        tbl = EmojiTable(engine)
+        assert await tbl.query(400343) == "🐷"
+        with pytest.raises(sa.exc.OperationalError):
+            await tbl.set(400343, "pig")
+
+
+async def test_migrate_without_rowid():
+    async with AsyncEngineFactory.sqlite3(None) as mem:
+        async with mem.begin() as conn:
+            await conn.exec_driver_sql(
+                "CREATE TABLE Emoji (eid INTEGER PRIMARY KEY, text VARCHAR)"
+            )
+            await conn.exec_driver_sql("INSERT INTO Emoji VALUES (400343, '🐷')")
+        tbl = EmojiTable(mem)
+        await tbl.create()
+
+        assert await tbl.migrate_without_rowid()
+        assert not await tbl.migrate_without_rowid()
+        async with mem.connect() as conn:
+            sqls = await conn.scalars(sa.text("SELECT sql FROM sqlite_master WHERE type='table'"))
+            assert all("WITHOUT ROWID" in sql for sql in sqls if "Emoji" in sql)
+        assert await tbl.query(400343) == "🐷"
+
+
+async def test_migrate_concurrently(tmp_path: Path):
+    db = tmp_path / "legacy.db"
+    async with AsyncEngineFactory.sqlite3(db) as engine:
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(
+                "CREATE TABLE Emoji (eid INTEGER PRIMARY KEY, text VARCHAR)"
+            )
+            await conn.exec_driver_sql("INSERT INTO Emoji VALUES (400343, '🐷')")
+            # left by a migration that failed half way
+            await conn.exec_driver_sql("CREATE TABLE Emoji_new (eid INTEGER PRIMARY KEY)")
+
+    async with AsyncEngineFactory.sqlite3(db) as e1, AsyncEngineFactory.sqlite3(db) as e2:
+        tables = EmojiTable(e1), EmojiTable(e2)
+        for tbl in tables:
+            await tbl.create()
+        results = await asyncio.gather(*(tbl.migrate_without_rowid() for tbl in tables))
+        assert sorted(results) == [False, True]
+        async with e1.connect() as conn:
+            names = (await conn.scalars(sa.text("SELECT name FROM sqlite_master"))).all()
+        assert "Emoji_new" not in names
+        assert await tables[1].query(400343) == "🐷"